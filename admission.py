@@ -0,0 +1,161 @@
+"""Admission control and load shedding for expensive routes"""
+import asyncio
+import math
+import time
+from typing import AsyncGenerator, Callable, List, Optional
+
+from fastapi import HTTPException, Request
+
+from cache import TTLCache
+from metrics import Counter, registry
+
+#  клиенты, для которых хранится корзина токенов
+CLIENTS_MAX_SIZE = 100000
+#  вес последнего запроса в скользящем среднем времени обработки
+SERVICE_TIME_WEIGHT = 0.2
+
+admission_controllers: List["AdmissionController"] = []
+
+admission_rejections_total = registry.register(
+    Counter(
+        "admission_rejections_total",
+        "Requests rejected by admission control",
+        ("controller", "reason"),
+    )
+)
+
+
+#  ключи клиента для ограничения частоты запросов
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client is not None else "unknown"
+
+
+#  клиент с токеном определяется по токену, без токена - по адресу
+def client_user(request: Request) -> str:
+    return request.headers.get("Authorization") or client_ip(request)
+
+
+class AdmissionController:
+    """Dependency that limits how many requests of a group of routes run at once.
+
+    A request first takes a token from its client's bucket (``rate`` tokens
+    per second up to ``burst``), otherwise it gets 429. It then runs if one
+    of ``max_concurrency`` slots is free, or waits in a queue of at most
+    ``max_queue`` requests for up to ``queue_timeout`` seconds. Requests that
+    cannot get a slot in time get 503 right away, without waiting out the
+    deadline: when the queue is full or the expected wait is longer than it.
+    Both responses carry ``Retry-After``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        rate: float = 0.0,
+        burst: int = 0,
+        client_key: Callable[[Request], str] = client_ip,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.rate = rate
+        self.burst = burst
+        self.client_key = client_key
+        self.in_flight = 0
+        self.waiting = 0
+        #  скользящее среднее времени обработки для оценки ожидания в очереди
+        self.service_seconds = 0.0
+        #  семафор создаётся при первом запросе, уже внутри цикла событий
+        self._slots: Optional[asyncio.Semaphore] = None
+        #  полная корзина равна отсутствующей, поэтому запись живёт время
+        #  полного пополнения
+        self._buckets = TTLCache(
+            max_size=CLIENTS_MAX_SIZE,
+            ttl=burst / rate if rate > 0 else 0,
+            name=f"{name}_token_buckets",
+        )
+        admission_controllers.append(self)
+
+    async def __call__(self, request: Request) -> AsyncGenerator[None, None]:
+        if self.rate > 0:
+            self._take_token(self.client_key(request))
+        await self._acquire()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(time.perf_counter() - started)
+
+    #  списание токена из корзины клиента
+    def _take_token(self, key: str) -> None:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = float(self.burst)
+        else:
+            tokens, updated = bucket
+            tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            admission_rejections_total.inc((self.name, "rate_limited"))
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil((1 - tokens) / self.rate))},
+            )
+        self._buckets.set(key, (tokens - 1, now))
+
+    #  ожидаемое время до освобождения слота для нового запроса в очереди
+    def _expected_wait(self) -> float:
+        return (self.waiting + 1) / self.max_concurrency * self.service_seconds
+
+    def _reject(self, reason: str):
+        admission_rejections_total.inc((self.name, reason))
+        retry_after = max(1, math.ceil(self._expected_wait()))
+        raise HTTPException(
+            status_code=503,
+            detail=f"Service is overloaded ({self.name}), retry later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    async def _acquire(self) -> None:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        #  свободный слот без очереди занимается сразу
+        if not self._slots.locked():
+            await self._slots.acquire()
+            self.in_flight += 1
+            return
+        if self.waiting >= self.max_queue:
+            self._reject("queue_full")
+        if self._expected_wait() > self.queue_timeout:
+            self._reject("deadline")
+        self.waiting += 1
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await self._slots.acquire()
+        except TimeoutError:
+            self._reject("timeout")
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    def _release(self, service_seconds: float) -> None:
+        self.in_flight -= 1
+        self._slots.release()
+        if self.service_seconds == 0:
+            self.service_seconds = service_seconds
+        else:
+            self.service_seconds += SERVICE_TIME_WEIGHT * (
+                service_seconds - self.service_seconds
+            )
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "service_ms_avg": self.service_seconds * 1000,
+        }
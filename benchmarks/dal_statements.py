@@ -0,0 +1,150 @@
+"""Micro-benchmark of the per-call statement overhead of the DAL hot paths.
+
+For each query it compares building the construct on every call (how the
+DAL used to work) with executing the module-level statement from the DAL.
+By default only the CPU side is measured: building the statement and
+looking it up in SQLAlchemy's compiled cache, which is what every
+``session.execute()`` does before talking to the database. With ``--db``
+each DAL method is also executed against ``REAL_DATABASE_URL``.
+
+Run from the project root: ``python -m benchmarks.dal_statements [--db]``
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import and_, delete, literal, select
+from sqlalchemy.dialects.postgresql import UUID as UUID_TYPE
+from sqlalchemy.dialects.postgresql import asyncpg, insert
+from sqlalchemy.util import LRUCache
+
+from post.dals import (
+    PostDAL,
+    add_reaction_queries,
+    remove_reaction_queries,
+    select_post_by_id,
+)
+from post.models import Post, post_like_table
+from user.dals import UserDAL, select_user_by_email
+from user.models import User
+
+EMAIL = "bench@example.com"
+POST_ID = uuid.uuid4()
+USER_ID = uuid.uuid4()
+
+
+#  прежние версии запросов, которые собирались при каждом вызове
+def build_user_by_email():
+    return select(User).where(User.email == EMAIL)
+
+
+def build_post_by_id():
+    return select(Post).where(Post.id == POST_ID)
+
+
+def build_add_like():
+    return (
+        insert(post_like_table)
+        .from_select(
+            ["post_id", "user_id"],
+            select(Post.id, literal(USER_ID, UUID_TYPE(as_uuid=True))).where(
+                and_(Post.id == POST_ID, Post.user_id != USER_ID)
+            ),
+        )
+        .on_conflict_do_nothing(index_elements=["post_id", "user_id"])
+        .returning(post_like_table.c.post_id)
+    )
+
+
+def build_remove_like():
+    return (
+        delete(post_like_table)
+        .where(
+            and_(
+                post_like_table.c.post_id == POST_ID,
+                post_like_table.c.user_id == USER_ID,
+            )
+        )
+        .returning(post_like_table.c.post_id)
+    )
+
+
+CASES = [
+    ("get_user_by_email", build_user_by_email, select_user_by_email),
+    ("get_post_by_id", build_post_by_id, select_post_by_id),
+    ("add_like_to_post", build_add_like, add_reaction_queries[post_like_table]),
+    ("remove_like_from_post", build_remove_like, remove_reaction_queries[post_like_table]),
+]
+
+
+#  среднее время вызова в микросекундах
+def measure(fn, iterations: int) -> float:
+    for _ in range(min(iterations, 100)):
+        fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+#  построение запроса и поиск в кэше компиляции, как в session.execute()
+def bench_statements(iterations: int) -> None:
+    dialect = asyncpg.dialect()
+    compiled_cache = LRUCache(500)
+
+    def compile_cached(statement):
+        statement._compile_w_cache(
+            dialect, compiled_cache=compiled_cache, column_keys=[]
+        )
+
+    print(f"{'statement':<24}{'built per call, us':>20}{'prebuilt, us':>15}{'speedup':>10}")
+    for name, build, prebuilt in CASES:
+        per_call = measure(lambda: compile_cached(build()), iterations)
+        cached = measure(lambda: compile_cached(prebuilt), iterations)
+        print(f"{name:<24}{per_call:>20.1f}{cached:>15.1f}{per_call / cached:>9.1f}x")
+
+
+#  полный вызов методов DAL с базой
+async def bench_database(iterations: int) -> None:
+    from session import async_session
+
+    async def run(fn) -> float:
+        async with async_session() as session:
+            await fn(session)
+            started = time.perf_counter()
+            for _ in range(iterations):
+                await fn(session)
+            return (time.perf_counter() - started) / iterations * 1e6
+
+    calls = {
+        "get_user_by_email": (
+            lambda s: s.execute(build_user_by_email()),
+            lambda s: UserDAL(s).get_user_by_email(EMAIL),
+        ),
+        "get_post_by_id": (
+            lambda s: s.execute(build_post_by_id()),
+            lambda s: PostDAL(s).get_post_by_id(POST_ID),
+        ),
+        "add_like_to_post": (
+            lambda s: s.execute(build_add_like()),
+            lambda s: PostDAL(s).add_like_to_post(POST_ID, USER_ID),
+        ),
+        "remove_like_from_post": (
+            lambda s: s.execute(build_remove_like()),
+            lambda s: PostDAL(s).remove_like_from_post(POST_ID, USER_ID),
+        ),
+    }
+    print(f"\n{'DAL call (database)':<24}{'built per call, us':>20}{'prebuilt, us':>15}")
+    for name, (per_call, prebuilt) in calls.items():
+        print(f"{name:<24}{await run(per_call):>20.1f}{await run(prebuilt):>15.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--db", action="store_true", help="also run against the database")
+    args = parser.parse_args()
+    bench_statements(args.iterations)
+    if args.db:
+        asyncio.run(bench_database(args.iterations // 10))
@@ -0,0 +1,378 @@
+"""Load test of the API over HTTP.
+
+``run`` starts ``main:app`` under uvicorn in a subprocess (or targets
+``--url``), creates the tables in ``REAL_DATABASE_URL`` if they are missing,
+registers benchmark users and posts, and then drives each scenario with
+``--concurrency`` httpx clients for ``--duration`` seconds. For every scenario
+it reports p50/p95/p99 latency, requests per second, errors and SQL queries
+per request (read from ``/metrics``, so it needs ``METRICS_ENABLED``), and
+writes the results with the commit they were taken at to a JSON file.
+``compare`` prints the change between two result files.
+
+Run from the project root::
+
+    python -m benchmarks.load_test run --output before.json
+    python -m benchmarks.load_test run --output after.json
+    python -m benchmarks.load_test compare before.json after.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+PASSWORD = "benchmark-password"
+#  сценарий смешанной нагрузки: доли запросов каждого вида
+MIXED_WEIGHTS = {
+    "get_post": 70,
+    "like_unlike": 15,
+    "create_post": 8,
+    "update_post": 5,
+    "login": 2,
+}
+
+
+class BenchmarkContext:
+    """Users and posts created for the run, shared by the scenarios"""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.emails: List[str] = []
+        self.headers: List[Dict[str, str]] = []
+        #  посты каждого пользователя по индексу пользователя
+        self.posts: List[List[str]] = []
+
+    def random_user(self) -> int:
+        return random.randrange(len(self.headers))
+
+    def random_post(self) -> str:
+        return random.choice(self.posts[self.random_user()])
+
+
+#  регистрация пользователей с токенами и начальных постов
+async def prepare(client: httpx.AsyncClient, users: int, posts_per_user: int):
+    context = BenchmarkContext(client)
+    run_id = uuid.uuid4().hex[:8]
+    for index in range(users):
+        email = f"bench-{run_id}-{index}@example.com"
+        response = await client.post(
+            "/user/",
+            json={
+                "name": "Bench",
+                "surname": "Mark",
+                "email": email,
+                "password": PASSWORD,
+            },
+        )
+        response.raise_for_status()
+        response = await client.post(
+            "/login/token", data={"username": email, "password": PASSWORD}
+        )
+        response.raise_for_status()
+        context.emails.append(email)
+        context.headers.append(
+            {"Authorization": f"Bearer {response.json()['access_token']}"}
+        )
+        context.posts.append([])
+        for number in range(posts_per_user):
+            response = await client.post(
+                "/post/create-post",
+                json={
+                    "title": f"Benchmark post {number}",
+                    "text": "Lorem ipsum. " * 20,
+                },
+                headers=context.headers[index],
+            )
+            response.raise_for_status()
+            context.posts[index].append(response.json()["id"])
+    return context
+
+
+#  отдельные запросы сценариев; каждый возвращает ответ сервера
+async def login(context: BenchmarkContext) -> httpx.Response:
+    email = context.emails[context.random_user()]
+    return await context.client.post(
+        "/login/token", data={"username": email, "password": PASSWORD}
+    )
+
+
+async def create_post(context: BenchmarkContext) -> httpx.Response:
+    user = context.random_user()
+    response = await context.client.post(
+        "/post/create-post",
+        json={"title": "Load test post", "text": "Lorem ipsum. " * 20},
+        headers=context.headers[user],
+    )
+    if response.status_code == 200:
+        context.posts[user].append(response.json()["id"])
+    return response
+
+
+async def get_post(context: BenchmarkContext) -> httpx.Response:
+    return await context.client.get(
+        "/post/",
+        params={"post_id": context.random_post()},
+        headers=context.headers[context.random_user()],
+    )
+
+
+async def like_unlike(context: BenchmarkContext) -> httpx.Response:
+    user = context.random_user()
+    post_id = context.random_post()
+    path = random.choice(["/post/like", "/post/like-remove"])
+    return await context.client.post(
+        path, params={"post_id": post_id}, headers=context.headers[user]
+    )
+
+
+async def update_post(context: BenchmarkContext) -> httpx.Response:
+    user = context.random_user()
+    return await context.client.patch(
+        "/post/",
+        params={"post_id": random.choice(context.posts[user])},
+        json={"title": f"Updated {random.randrange(1000000)}"},
+        headers=context.headers[user],
+    )
+
+
+async def mixed(context: BenchmarkContext) -> httpx.Response:
+    name = random.choices(list(MIXED_WEIGHTS), weights=list(MIXED_WEIGHTS.values()))[0]
+    return await SCENARIOS[name](context)
+
+
+SCENARIOS: Dict[str, Callable[[BenchmarkContext], Awaitable[httpx.Response]]] = {
+    "login": login,
+    "create_post": create_post,
+    "get_post": get_post,
+    "like_unlike": like_unlike,
+    "update_post": update_post,
+    "mixed": mixed,
+}
+
+
+#  сумма и число наблюдений гистограммы запросов к базе на HTTP-запрос
+async def read_query_totals(client: httpx.AsyncClient) -> Optional[tuple]:
+    response = await client.get("/metrics")
+    if response.status_code != 200:
+        return None
+    total, count = 0.0, 0.0
+    for line in response.text.splitlines():
+        if line.startswith("http_request_db_queries_sum"):
+            total += float(line.rsplit(" ", 1)[1])
+        elif line.startswith("http_request_db_queries_count"):
+            count += float(line.rsplit(" ", 1)[1])
+    return total, count
+
+
+#  значение перцентиля по отсортированному списку (nearest-rank)
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    index = math.ceil(fraction * len(values)) - 1
+    return values[min(max(index, 0), len(values) - 1)]
+
+
+#  нагрузка одним сценарием: concurrency клиентов в течение duration секунд
+async def run_scenario(
+    context: BenchmarkContext, name: str, concurrency: int, duration: float
+) -> dict:
+    scenario = SCENARIOS[name]
+    latencies: List[float] = []
+    errors = 0
+    before = await read_query_totals(context.client)
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await scenario(context)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    after = await read_query_totals(context.client)
+    latencies.sort()
+    queries_per_request = None
+    if before is not None and after is not None and after[1] > before[1] + 1:
+        #  опрос /metrics перед сценарием тоже попадает в гистограмму
+        queries_per_request = (after[0] - before[0]) / (after[1] - before[1] - 1)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "queries_per_request": queries_per_request,
+    }
+
+
+#  запуск приложения под uvicorn и ожидание его готовности
+async def start_server(port: int) -> subprocess.Popen:
+    env = os.environ.copy()
+    #  все запросы идут с одного адреса, поэтому ограничение частоты входов
+    #  по IP отключается, если оно не задано явно
+    env.setdefault("LOGIN_RATE_PER_MINUTE", "0")
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        env=env,
+    )
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+        for _ in range(100):
+            if server.poll() is not None:
+                raise RuntimeError("uvicorn exited before it started serving")
+            try:
+                await client.get("/metrics")
+                return server
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("uvicorn did not start serving in 10 seconds")
+
+
+#  создание недостающих таблиц в базе приложения
+async def create_tables() -> None:
+    from post.models import Base as PostBase
+    from session import engine
+    from user.models import Base as UserBase
+
+    async with engine.begin() as connection:
+        await connection.run_sync(UserBase.metadata.create_all)
+        await connection.run_sync(PostBase.metadata.create_all)
+    await engine.dispose()
+
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> dict:
+    server = None
+    url = args.url
+    if url is None:
+        await create_tables()
+        server = await start_server(args.port)
+        url = f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+            context = await prepare(client, args.users, args.posts_per_user)
+            results = {}
+            print(RESULT_HEADER)
+            for name in args.scenarios:
+                results[name] = await run_scenario(
+                    context, name, args.concurrency, args.duration
+                )
+                print_results({name: results[name]})
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    return {
+        "commit": current_commit(),
+        "time": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "scenarios": results,
+    }
+
+
+RESULT_HEADER = (
+    f"{'scenario':<14}{'rps':>10}{'p50, ms':>10}{'p95, ms':>10}{'p99, ms':>10}"
+    f"{'queries':>10}{'errors':>8}"
+)
+
+
+def print_results(scenarios: Dict[str, dict]) -> None:
+    for name, result in scenarios.items():
+        queries = result["queries_per_request"]
+        print(
+            f"{name:<14}{result['rps']:>10.1f}{result['p50_ms']:>10.1f}"
+            f"{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+            f"{'-' if queries is None else f'{queries:.2f}':>10}{result['errors']:>8}"
+        )
+
+
+#  изменение показателей между двумя прогонами в процентах
+def compare(base: dict, new: dict) -> None:
+    print(f"{base.get('commit')} -> {new.get('commit')}")
+    print(f"{'scenario':<14}{'metric':<22}{'base':>12}{'new':>12}{'change':>10}")
+    for name, base_result in base["scenarios"].items():
+        new_result = new["scenarios"].get(name)
+        if new_result is None:
+            continue
+        for metric in ("rps", "p50_ms", "p95_ms", "p99_ms", "queries_per_request"):
+            old_value, new_value = base_result[metric], new_result[metric]
+            if old_value is None or new_value is None:
+                continue
+            change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+            print(
+                f"{name:<14}{metric:<22}{old_value:>12.2f}{new_value:>12.2f}"
+                f"{change:>+9.1f}%"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the scenarios")
+    run_parser.add_argument(
+        "--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS)
+    )
+    run_parser.add_argument("--concurrency", type=int, default=32)
+    run_parser.add_argument(
+        "--duration", type=float, default=10.0, help="seconds per scenario"
+    )
+    run_parser.add_argument("--users", type=int, default=20)
+    run_parser.add_argument("--posts-per-user", type=int, default=5)
+    run_parser.add_argument("--port", type=int, default=8765)
+    run_parser.add_argument("--url", help="benchmark an already running server instead")
+    run_parser.add_argument("--output", help="write the results to this JSON file")
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = asyncio.run(run(args))
+        if args.output:
+            with open(args.output, "w") as output:
+                json.dump(report, output, indent=2)
+    else:
+        with open(args.base) as base_file, open(args.new) as new_file:
+            compare(json.load(base_file), json.load(new_file))
@@ -0,0 +1,354 @@
+"""Synthetic data generator for scale testing.
+
+Fills ``users``, ``posts``, ``post_like`` and ``post_dislike`` with skewed,
+realistic data: post authorship follows a power law (a few users write most
+posts), post popularity is Zipfian (a few posts get most reactions) and the
+number of reactions per user is Pareto-distributed. Rows are generated in
+fixed-size chunks, each with its own RNG derived from ``--seed``, so the
+same arguments always produce the same dataset whatever ``--workers`` is.
+Chunks are loaded by worker processes with binary ``COPY``; afterwards the
+post reaction counters are recounted and the tables analyzed.
+
+Ids are derived from the seed and the row number, so loading twice with the
+same seed conflicts on primary keys: use ``--truncate`` to empty the tables
+first.
+
+Run from the project root::
+
+    python -m benchmarks.seed --users 1000000 --posts 10000000 --reactions 30000000
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import math
+import multiprocessing
+import random
+import time
+import uuid
+from typing import Iterator, List, Tuple
+
+import asyncpg
+
+import settings
+from post.models import Post, post_dislike_table, post_like_table
+from user.hashing import Hasher
+from user.models import User
+
+CHUNK_SIZE = 50000
+#  пароль всех сгенерированных пользователей; bcrypt считается один раз
+PASSWORD = "password"
+FIRST_NAMES = ["Ivan", "Petr", "Anna", "Maria", "Olga", "Sergey", "Elena", "Dmitry"]
+LAST_NAMES = ["Ivanov", "Petrov", "Sidorov", "Smirnov", "Kuznetsov", "Popov", "Volkov"]
+#  словарь текстов постов: слова выбираются по Ципфу, как в естественном языке
+WORDS = (
+    "город работа время жизнь человек день год дело дом друг мир вопрос сила "
+    "рука слово место лицо страна ночь голова глаз вода земля книга музыка "
+    "дорога история утро солнце море небо лес река поле школа семья проект "
+    "новость фото отпуск погода кофе кино игра спорт команда матч победа "
+    "путешествие поезд самолёт рецепт ужин завтрак праздник подарок идея "
+    "код сервер база запрос ошибка релиз тест кошка собака весна лето осень зима"
+).split()
+WORD_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(WORDS) + 1)))
+
+USER_COLUMNS = ["user_id", "name", "surname", "email", "is_active", "hashed_password"]
+POST_COLUMNS = [
+    "id",
+    "user_id",
+    "title",
+    "text",
+    "time_created",
+    "like_count",
+    "dislike_count",
+]
+REACTION_COLUMNS = ["post_id", "user_id"]
+
+
+class SeedConfig:
+    """Dataset shape shared by the parent and the worker processes"""
+
+    def __init__(self, args: argparse.Namespace, hashed_password: str):
+        self.seed = args.seed
+        self.users = args.users
+        self.posts = args.posts
+        self.reactions = args.reactions
+        self.dislike_share = args.dislike_share
+        self.author_exponent = args.author_exponent
+        self.popularity_exponent = args.popularity_exponent
+        self.activity_alpha = args.activity_alpha
+        self.until = args.until
+        self.days = args.days
+        self.hashed_password = hashed_password
+        self.dsn = args.dsn
+        self.user_ids = _namespace(args.seed, "users")
+        self.post_ids = _namespace(args.seed, "posts")
+        #  перестановки рангов, чтобы самые активные авторы и самые популярные
+        #  посты были разбросаны по таблице, а не шли первыми строками
+        self.user_step = _coprime_step(args.users)
+        self.post_step = _coprime_step(args.posts)
+
+
+def _namespace(seed: int, kind: str) -> uuid.UUID:
+    return uuid.uuid5(uuid.NAMESPACE_OID, f"seed:{seed}:{kind}")
+
+
+#  шаг перестановки rank -> rank * step % n, взаимно простой с n
+def _coprime_step(n: int) -> int:
+    step = 2654435761
+    while math.gcd(step, max(n, 1)) != 1:
+        step += 2
+    return step
+
+
+#  ранг по степенному закону с показателем exponent среди n значений:
+#  обратная функция распределения непрерывного аналога закона Ципфа
+def zipf_rank(rng: random.Random, n: int, exponent: float) -> int:
+    u = rng.random()
+    if exponent == 1.0:
+        x = (n + 1) ** u
+    else:
+        x = (1 + u * ((n + 1) ** (1 - exponent) - 1)) ** (1 / (1 - exponent))
+    return min(int(x) - 1, n - 1)
+
+
+def user_id(config: SeedConfig, index: int) -> uuid.UUID:
+    return uuid.uuid5(config.user_ids, str(index))
+
+
+def post_id(config: SeedConfig, index: int) -> uuid.UUID:
+    return uuid.uuid5(config.post_ids, str(index))
+
+
+#  генератор строк одной пачки; у каждой пачки свой ГСЧ
+def _chunk_rng(config: SeedConfig, kind: str, chunk: int) -> random.Random:
+    return random.Random(f"{config.seed}:{kind}:{chunk}")
+
+
+def _chunk_range(chunk: int, total: int) -> range:
+    return range(chunk * CHUNK_SIZE, min((chunk + 1) * CHUNK_SIZE, total))
+
+
+def _sentence(rng: random.Random, length: int) -> str:
+    return " ".join(rng.choices(WORDS, cum_weights=WORD_WEIGHTS, k=length))
+
+
+def generate_users(config: SeedConfig, chunk: int) -> Iterator[tuple]:
+    rng = _chunk_rng(config, "users", chunk)
+    for index in _chunk_range(chunk, config.users):
+        yield (
+            user_id(config, index),
+            rng.choice(FIRST_NAMES),
+            rng.choice(LAST_NAMES),
+            f"user{index}@seed.example.com",
+            True,
+            config.hashed_password,
+        )
+
+
+#  посты идут по времени создания; автор выбирается по степенному закону
+def generate_posts(config: SeedConfig, chunk: int) -> Iterator[tuple]:
+    rng = _chunk_rng(config, "posts", chunk)
+    started = config.until - datetime.timedelta(days=config.days)
+    interval = datetime.timedelta(days=config.days) / max(config.posts, 1)
+    for index in _chunk_range(chunk, config.posts):
+        author_rank = zipf_rank(rng, config.users, config.author_exponent)
+        author = author_rank * config.user_step % config.users
+        yield (
+            post_id(config, index),
+            user_id(config, author),
+            _sentence(rng, rng.randint(2, 6)).capitalize(),
+            _sentence(rng, rng.randint(10, 80)),
+            started + interval * (index + rng.random()),
+            0,
+            0,
+        )
+
+
+#  реакции пользователей пачки: их число у пользователя распределено по Парето
+#  со средним reactions / users, посты выбираются по закону Ципфа без повторов
+def generate_reactions(
+    config: SeedConfig, chunk: int
+) -> Tuple[List[tuple], List[tuple]]:
+    rng = _chunk_rng(config, "reactions", chunk)
+    mean = config.reactions / config.users
+    alpha = config.activity_alpha
+    scale = mean * (alpha - 1) / alpha
+    likes, dislikes = [], []
+    for index in _chunk_range(chunk, config.users):
+        count = min(int(scale * (1 - rng.random()) ** (-1 / alpha)), config.posts)
+        reactor = user_id(config, index)
+        chosen = set()
+        for _ in range(count * 2):
+            if len(chosen) >= count:
+                break
+            chosen.add(zipf_rank(rng, config.posts, config.popularity_exponent))
+        for rank in chosen:
+            row = (post_id(config, rank * config.post_step % config.posts), reactor)
+            if rng.random() < config.dislike_share:
+                dislikes.append(row)
+            else:
+                likes.append(row)
+    return likes, dislikes
+
+
+async def _copy_chunk(config: SeedConfig, kind: str, chunk: int) -> int:
+    connection = await asyncpg.connect(config.dsn)
+    try:
+        if kind == "users":
+            result = await connection.copy_records_to_table(
+                User.__table__.name,
+                records=generate_users(config, chunk),
+                columns=USER_COLUMNS,
+            )
+        elif kind == "posts":
+            result = await connection.copy_records_to_table(
+                Post.__table__.name,
+                records=generate_posts(config, chunk),
+                columns=POST_COLUMNS,
+            )
+        else:
+            likes, dislikes = generate_reactions(config, chunk)
+            async with connection.transaction():
+                await connection.copy_records_to_table(
+                    post_like_table.name, records=likes, columns=REACTION_COLUMNS
+                )
+                await connection.copy_records_to_table(
+                    post_dislike_table.name, records=dislikes, columns=REACTION_COLUMNS
+                )
+            return len(likes) + len(dislikes)
+    finally:
+        await connection.close()
+    #  asyncpg возвращает статус команды вида "COPY 50000"
+    return int(result.split()[-1])
+
+
+_worker_config: SeedConfig = None
+
+
+def _init_worker(config: SeedConfig) -> None:
+    global _worker_config
+    _worker_config = config
+
+
+def _load_chunk(task: Tuple[str, int]) -> int:
+    kind, chunk = task
+    return asyncio.run(_copy_chunk(_worker_config, kind, chunk))
+
+
+#  загрузка всех пачек одной таблицы пулом процессов
+def load(pool, kind: str, total: int) -> None:
+    chunks = math.ceil(total / CHUNK_SIZE)
+    started = time.perf_counter()
+    rows = 0
+    for rows_in_chunk in pool.imap_unordered(
+        _load_chunk, [(kind, chunk) for chunk in range(chunks)]
+    ):
+        rows += rows_in_chunk
+    elapsed = time.perf_counter() - started
+    print(
+        f"{kind:<10}{rows:>12} rows{elapsed:>8.1f} s"
+        f"{rows / elapsed * 60:>14.0f} rows/min"
+    )
+
+
+async def prepare_database(dsn: str, truncate: bool) -> None:
+    from post.models import Base as PostBase
+    from session import engine
+    from user.models import Base as UserBase
+
+    async with engine.begin() as connection:
+        await connection.run_sync(UserBase.metadata.create_all)
+        await connection.run_sync(PostBase.metadata.create_all)
+    await engine.dispose()
+    if truncate:
+        connection = await asyncpg.connect(dsn)
+        try:
+            await connection.execute(
+                f"TRUNCATE {User.__table__.name}, {Post.__table__.name}, "
+                f"{post_like_table.name}, {post_dislike_table.name} CASCADE"
+            )
+        finally:
+            await connection.close()
+
+
+#  пересчёт счётчиков реакций постов по загруженным реакциям и сбор статистики
+async def finish_database(dsn: str) -> None:
+    connection = await asyncpg.connect(dsn)
+    try:
+        for table, counter in (
+            (post_like_table.name, "like_count"),
+            (post_dislike_table.name, "dislike_count"),
+        ):
+            await connection.execute(
+                f"UPDATE {Post.__table__.name} SET {counter} = reactions.count "
+                f"FROM (SELECT post_id, count(*) AS count FROM {table} "
+                "GROUP BY post_id) AS reactions "
+                f"WHERE {Post.__table__.name}.id = reactions.post_id"
+            )
+        await connection.execute(
+            f"ANALYZE {User.__table__.name}, {Post.__table__.name}, "
+            f"{post_like_table.name}, {post_dislike_table.name}"
+        )
+    finally:
+        await connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--posts", type=int, default=1000000)
+    parser.add_argument(
+        "--reactions", type=int, default=3000000, help="approximate total"
+    )
+    parser.add_argument("--dislike-share", type=float, default=0.15)
+    parser.add_argument(
+        "--author-exponent",
+        type=float,
+        default=1.0,
+        help="power law exponent of posts per author",
+    )
+    parser.add_argument(
+        "--popularity-exponent",
+        type=float,
+        default=1.0,
+        help="Zipf exponent of post popularity",
+    )
+    parser.add_argument(
+        "--activity-alpha",
+        type=float,
+        default=1.5,
+        help="Pareto shape of reactions per user",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--until",
+        type=datetime.datetime.fromisoformat,
+        default=datetime.datetime(2023, 6, 1, tzinfo=datetime.timezone.utc),
+        help="creation time of the newest post",
+    )
+    parser.add_argument("--days", type=int, default=365, help="time span of the posts")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument(
+        "--truncate", action="store_true", help="empty the tables first"
+    )
+    parser.add_argument(
+        "--dsn",
+        default=settings.REAL_DATABASE_URL.replace(
+            "postgresql+asyncpg://", "postgresql://"
+        ),
+    )
+    args = parser.parse_args()
+    if args.activity_alpha <= 1:
+        parser.error("--activity-alpha must be greater than 1")
+
+    asyncio.run(prepare_database(args.dsn, args.truncate))
+    config = SeedConfig(args, Hasher.get_password_hash(PASSWORD))
+    #  spawn, как и у пула хэширования, не копирует соединения родителя
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(
+        args.workers, initializer=_init_worker, initargs=(config,)
+    ) as pool:
+        load(pool, "users", args.users)
+        load(pool, "posts", args.posts)
+        load(pool, "reactions", args.users)
+    asyncio.run(finish_database(args.dsn))
@@ -0,0 +1,81 @@
+"""Micro-benchmark of the per-request response serialization cost.
+
+Compares the default FastAPI path (re-validating the returned model against
+``response_model``, ``jsonable_encoder`` and stdlib ``json``) with returning
+an already validated model in ``ModelResponse`` (orjson).
+
+Run from the project root: ``python -m benchmarks.serialization``
+"""
+import argparse
+import asyncio
+import datetime
+import time
+import uuid
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from post.schemas import PostFeed, ShowPost
+from responses import ModelResponse
+
+
+#  страница ленты из limit постов
+def make_feed(limit: int) -> PostFeed:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    posts = [
+        ShowPost(
+            id=uuid.uuid4(),
+            user_id=uuid.uuid4(),
+            title=f"Post {i}",
+            text="Lorem ipsum dolor sit amet. " * 10,
+            time_created=now - datetime.timedelta(minutes=i),
+            time_updated=None,
+            like_count=i * 3,
+            dislike_count=i,
+        )
+        for i in range(limit)
+    ]
+    return PostFeed(posts=posts, next_cursor="eyJ0IjoxfQ")
+
+
+#  путь FastAPI по умолчанию: повторная валидация по response_model и json
+async def fastapi_default(field, content) -> bytes:
+    value = await serialize_response(field=field, response_content=content)
+    return JSONResponse(value).body
+
+
+#  быстрый путь: готовая модель сразу кодируется orjson
+async def model_response(field, content) -> bytes:
+    return ModelResponse(content).body
+
+
+#  среднее время одного вызова в микросекундах
+async def measure(fn, field, content, iterations: int) -> float:
+    for _ in range(min(iterations, 100)):
+        await fn(field, content)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await fn(field, content)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def main(iterations: int) -> None:
+    cases = [
+        ("ShowPost", ShowPost, make_feed(1).posts[0]),
+        ("PostFeed(20)", PostFeed, make_feed(20)),
+        ("PostFeed(100)", PostFeed, make_feed(100)),
+    ]
+    print(f"{'response':<16}{'fastapi, us':>14}{'orjson, us':>14}{'speedup':>10}")
+    for name, model, content in cases:
+        field = create_response_field(name=f"Response_{name}", type_=model)
+        default = await measure(fastapi_default, field, content, iterations)
+        fast = await measure(model_response, field, content, iterations)
+        print(f"{name:<16}{default:>14.1f}{fast:>14.1f}{default / fast:>9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations))
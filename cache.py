@@ -0,0 +1,131 @@
+"""In-process caches shared by the services"""
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from singleflight import SingleFlight
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Size-bounded LRU cache with per-entry expiry and single-flight loading"""
+
+    def __init__(self, max_size: int, ttl: float, name: str = "cache"):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        #  создаётся при первой загрузке, чтобы кэши без загрузок не попадали в счётчики
+        self._loads: Optional[SingleFlight] = None
+        #  увеличивается при инвалидации, чтобы загрузки, начатые до неё, не попали в кэш
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    #  получение значения, просроченные записи удаляются
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    #  сохранение значения с вытеснением давно не использованных записей
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self._generation += 1
+        self._entries.pop(key, None)
+
+    #  удаление всех записей, значения которых подходят под условие
+    def delete_where(self, predicate: Callable[[Any], bool]) -> None:
+        self._generation += 1
+        for key in [key for key, (value, _) in self._entries.items() if predicate(value)]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+
+    #  получение значения из кэша или загрузка одним вызовом loader на ключ;
+    #  None не кэшируется
+    async def get_or_load(
+        self, key: Hashable, loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self._loads is None:
+            self._loads = SingleFlight(self.name)
+        return await self._loads.do(key, lambda: self._load(key, loader))
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        generation = self._generation
+        value = await loader()
+        if value is not None and generation == self._generation:
+            self.set(key, value)
+        return value
+
+
+class MemoryCacheBackend:
+    """Async key-value cache backend kept in process memory"""
+
+    def __init__(self, max_size: int):
+        self._cache = TTLCache(max_size=max_size, ttl=0)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._cache.set(key, value, ttl=ttl)
+
+    #  сохранение значения, только если ключа ещё нет
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        if self._cache.get(key) is not None:
+            return False
+        self._cache.set(key, value, ttl=ttl)
+        return True
+
+    async def set_many(self, items: Dict[str, bytes], ttl: float) -> None:
+        for key, value in items.items():
+            self._cache.set(key, value, ttl=ttl)
+
+
+class RedisCacheBackend:
+    """Async key-value cache backend shared between processes through Redis"""
+
+    def __init__(self, url: str):
+        #  redis нужен только при использовании этого бэкенда
+        try:
+            from redis import asyncio as redis
+        except ImportError as err:
+            raise RuntimeError(
+                "The redis package is required for the redis cache backend"
+            ) from err
+        self._client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self._client.set(key, value, px=int(ttl * 1000))
+
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        return bool(await self._client.set(key, value, px=int(ttl * 1000), nx=True))
+
+    async def set_many(self, items: Dict[str, bytes], ttl: float) -> None:
+        async with self._client.pipeline(transaction=False) as pipeline:
+            for key, value in items.items():
+                pipeline.set(key, value, px=int(ttl * 1000))
+            await pipeline.execute()
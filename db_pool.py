@@ -0,0 +1,87 @@
+"""Connection pool that keeps checkout statistics"""
+import time
+from typing import Dict, Union
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class PoolStats:
+    """Counters of connection checkouts since the pool was created"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.timeouts = 0
+        #  выдачи соединения, когда в пуле не было свободных
+        self.exhausted_checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    #  учёт одной выдачи соединения и времени её ожидания
+    def record_checkout(self, wait_seconds: float, exhausted: bool) -> None:
+        self.checkouts += 1
+        if exhausted:
+            self.exhausted_checkouts += 1
+        self.wait_seconds_total += wait_seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """Async queue pool that also records how long checkouts wait.
+
+    The wait time covers everything ``connect()`` does: waiting for a free
+    connection, opening an overflow connection and the pre-ping.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    #  при пересоздании пула (engine.dispose) счётчики сохраняются
+    def recreate(self) -> "InstrumentedAsyncPool":
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def connect(self):
+        exhausted = self.checkedin() == 0
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            self.stats.record_checkout(time.perf_counter() - started, exhausted)
+
+    def _create_connection(self):
+        self.stats.connects += 1
+        return super()._create_connection()
+
+    def _do_return_conn(self, record) -> None:
+        self.stats.checkins += 1
+        super()._do_return_conn(record)
+
+    #  текущее состояние пула и накопленные счётчики
+    def snapshot(self) -> Dict[str, Union[int, float]]:
+        stats = self.stats
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "idle": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "max_overflow": self._max_overflow,
+            "checkouts": stats.checkouts,
+            "checkins": stats.checkins,
+            "connects": stats.connects,
+            "timeouts": stats.timeouts,
+            "exhausted_checkouts": stats.exhausted_checkouts,
+            "wait_ms_avg": (
+                stats.wait_seconds_total / stats.checkouts * 1000
+                if stats.checkouts
+                else 0.0
+            ),
+            "wait_ms_max": stats.wait_seconds_max * 1000,
+        }
@@ -0,0 +1,19 @@
+"""Helpers for ETag and conditional GET handling"""
+import hashlib
+from typing import Optional
+
+
+#  строгий ETag из значений, от которых зависит представление ресурса
+def make_etag(*parts) -> str:
+    raw = "|".join(str(part) for part in parts).encode()
+    return '"{}"'.format(hashlib.blake2b(raw, digest_size=12).hexdigest())
+
+
+#  проверка заголовка If-None-Match (сравнение по RFC 7232 - слабое)
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
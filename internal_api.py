@@ -0,0 +1,140 @@
+from typing import Iterable, List
+
+from fastapi import APIRouter, Response
+
+from admission import admission_controllers
+from metrics import Counter, Gauge, Metric, registry
+from session import engine, replica_router
+from singleflight import single_flight_groups
+from user.hashing import hashing_stats
+
+internal_router = APIRouter()
+metrics_router = APIRouter()
+
+
+#  счётчики объединения одинаковых запросов
+@internal_router.get("/singleflight")
+async def get_single_flight_stats() -> List[dict]:
+    return [group.stats() for group in single_flight_groups]
+
+
+#  состояние пула соединений с базой и время ожидания соединений
+@internal_router.get("/db-pool")
+async def get_db_pool_stats() -> dict:
+    return engine.pool.snapshot()
+
+
+#  занятые слоты и очереди ограничителей дорогих маршрутов
+@internal_router.get("/admission")
+async def get_admission_stats() -> List[dict]:
+    return [controller.stats() for controller in admission_controllers]
+
+
+#  состояние реплик для чтения
+@internal_router.get("/db-replicas")
+async def get_db_replica_stats() -> List[dict]:
+    return replica_router.stats()
+
+
+#  метрики пулов соединений, реплик, объединения запросов и хэширования,
+#  собранные из уже накопленной статистики в момент опроса
+def _collect_service_metrics() -> Iterable[Metric]:
+    pool_connections = Gauge(
+        "db_pool_connections", "Pool connections by state", ("database", "state")
+    )
+    pool_checkouts = Counter(
+        "db_pool_checkouts_total", "Connection checkouts", ("database",)
+    )
+    pool_exhausted = Counter(
+        "db_pool_exhausted_checkouts_total",
+        "Checkouts made when the pool had no idle connection",
+        ("database",),
+    )
+    pool_timeouts = Counter(
+        "db_pool_timeouts_total", "Checkouts that timed out", ("database",)
+    )
+    pool_wait = Counter(
+        "db_pool_checkout_wait_seconds_total",
+        "Time spent waiting for checkouts",
+        ("database",),
+    )
+    pools = [("primary", engine.pool)] + [
+        (f"replica{index}", replica.engine.pool)
+        for index, replica in enumerate(replica_router.replicas)
+    ]
+    for database, pool in pools:
+        labels = (database,)
+        pool_connections.set((database, "checked_out"), pool.checkedout())
+        pool_connections.set((database, "idle"), pool.checkedin())
+        pool_connections.set((database, "overflow"), max(pool.overflow(), 0))
+        pool_checkouts.inc(labels, pool.stats.checkouts)
+        pool_exhausted.inc(labels, pool.stats.exhausted_checkouts)
+        pool_timeouts.inc(labels, pool.stats.timeouts)
+        pool_wait.inc(labels, pool.stats.wait_seconds_total)
+
+    replica_healthy = Gauge(
+        "db_replica_healthy", "1 if the replica receives reads", ("database",)
+    )
+    for index, replica in enumerate(replica_router.stats()):
+        replica_healthy.set((f"replica{index}",), int(replica["healthy"]))
+
+    single_flight_calls = Counter(
+        "singleflight_calls_total", "Calls to single-flight groups", ("group",)
+    )
+    single_flight_coalesced = Counter(
+        "singleflight_coalesced_total",
+        "Calls served by an identical call in flight",
+        ("group",),
+    )
+    for group in single_flight_groups:
+        single_flight_calls.inc((group.name,), group.calls)
+        single_flight_coalesced.inc((group.name,), group.coalesced)
+
+    hashing_in_flight = Gauge(
+        "password_hashing_in_flight", "Password hashes queued or running"
+    )
+    hashing_in_flight.set((), hashing_stats.in_flight)
+    hashing_completed = Counter(
+        "password_hashing_completed_total", "Password hashes computed"
+    )
+    hashing_completed.inc((), hashing_stats.completed)
+    hashing_wait = Counter(
+        "password_hashing_queue_wait_seconds_total",
+        "Time password hashes waited for a worker",
+    )
+    hashing_wait.inc((), hashing_stats.queue_wait_seconds_total)
+
+    admission_in_flight = Gauge(
+        "admission_in_flight", "Requests admitted and running", ("controller",)
+    )
+    admission_waiting = Gauge(
+        "admission_waiting", "Requests waiting for a slot", ("controller",)
+    )
+    for controller in admission_controllers:
+        admission_in_flight.set((controller.name,), controller.in_flight)
+        admission_waiting.set((controller.name,), controller.waiting)
+
+    return [
+        pool_connections,
+        pool_checkouts,
+        pool_exhausted,
+        pool_timeouts,
+        pool_wait,
+        replica_healthy,
+        single_flight_calls,
+        single_flight_coalesced,
+        hashing_in_flight,
+        hashing_completed,
+        hashing_wait,
+        admission_in_flight,
+        admission_waiting,
+    ]
+
+
+registry.add_collector(_collect_service_metrics)
+
+
+#  метрики в текстовом формате Prometheus
+@metrics_router.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
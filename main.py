@@ -1,23 +1,87 @@
 import uvicorn
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.routing import APIRouter
 
+import settings
+from admission import AdmissionController, client_ip
+from internal_api import internal_router, metrics_router
+from metrics import MetricsMiddleware
+from responses import ModelResponse
 from user.api import user_router
 from user.api_login import login_router
 from post.api import post_router
+from post.counters import reaction_counters
+from post.ingestion import reaction_ingestor
+from post.timeline import timeline_trimmer
+from post.trending import trending_posts
+from user.revocation import revocation_list
 
 # create instance of the app
-app = FastAPI(title="Social network API", version="1.0.0")
+app = FastAPI(
+    title="Social network API",
+    version="1.0.0",
+    default_response_class=ModelResponse,
+)
 
 # create the instance for the routes
 main_api_router = APIRouter()
 
+#  ограничение входа: хэширование паролей в /login не должно забирать время
+#  у остальных запросов; регистрация ограничивается в user.api, /post - нет
+login_admission = AdmissionController(
+    "login",
+    max_concurrency=settings.LOGIN_MAX_CONCURRENCY,
+    max_queue=settings.LOGIN_MAX_QUEUE,
+    queue_timeout=settings.LOGIN_QUEUE_TIMEOUT_SECONDS,
+    rate=settings.LOGIN_RATE_PER_MINUTE / 60,
+    burst=settings.LOGIN_RATE_BURST,
+    client_key=client_ip,
+)
+
 # set routes to the app instance
 main_api_router.include_router(user_router, prefix="/user", tags=["user"])
-main_api_router.include_router(login_router, prefix="/login", tags=["login"])
+main_api_router.include_router(
+    login_router,
+    prefix="/login",
+    tags=["login"],
+    dependencies=[Depends(login_admission)],
+)
 main_api_router.include_router(post_router, prefix="/post", tags=["post"])
+main_api_router.include_router(
+    internal_router, prefix="/internal", tags=["internal"]
+)
+main_api_router.include_router(metrics_router, tags=["internal"])
 app.include_router(main_api_router)
 
+#  метрики запросов для /metrics
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+
+#  запуск фоновых задач
+@app.on_event("startup")
+async def startup():
+    if settings.AUTH_STATELESS_TOKENS:
+        await revocation_list.start()
+    timeline_trimmer.start()
+    trending_posts.start()
+    reaction_counters.start()
+    if settings.REACTION_INGESTION_ENABLED:
+        reaction_ingestor.start()
+
+
+#  остановка фоновых задач
+@app.on_event("shutdown")
+async def shutdown():
+    await revocation_list.stop()
+    await timeline_trimmer.stop()
+    await trending_posts.stop()
+    #  очередь реакций дописывается до остановки буфера счётчиков
+    await reaction_ingestor.stop()
+    #  перед остановкой записываются оставшиеся приращения счётчиков
+    await reaction_counters.stop()
+
+
 if __name__ == "__main__":
     # run app on the host and port
     uvicorn.run(app, host="0.0.0.0", port=8000)
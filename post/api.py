@@ -1,27 +1,49 @@
 from logging import getLogger
+from typing import List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from session import get_db
-from user.models import User
+import settings
+from etag import etag_matches
+from responses import ModelResponse
+from session import get_db, get_read_db
+from user.schemas import Principal
 from user.services import get_current_user_from_token
 
+from .cursor import InvalidCursor
+from .ingestion import DISLIKE, LIKE, ReactionQueueFull
+from .trending import trending_posts
 from .schemas import (
+    PostBatch,
     PostCreate,
     PostDeleteResponse,
+    PostFeed,
+    PostSearchPage,
     ShowPost,
+    TrendingPage,
     UpdatedPostResponse,
     UpdatePostReuest,
+    ViewerReactions,
 )
 from .services import (
     _create_new_post,
     _delete_post,
+    _enqueue_reaction,
+    _export_user_posts,
     _like_post,
     _remove_like_post,
     _get_post_by_id,
+    _get_post_etag,
+    _show_post_etag,
+    _get_feed,
+    _get_posts_batch,
+    _get_viewer_reactions,
+    _get_home_timeline,
+    _search_posts,
     _dislike_post,
     _remove_dislike_post,
     _update_post,
@@ -37,14 +59,15 @@ post_router = APIRouter()
 async def create_post(
     body: PostCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user_from_token),
-) -> ShowPost:
+    current_user: Principal = Depends(get_current_user_from_token),
+) -> ModelResponse:
     try:
         #  вызывается функция создания нового поста
-        return await _create_new_post(body, current_user.user_id, db)
+        post = await _create_new_post(body, current_user.user_id, db)
     except IntegrityError as err:
         logger.error(err)
         raise HTTPException(status_code=503, detail=f"Database error: {err}")
+    return ModelResponse(post)
 
 
 #  удаление поста
@@ -52,31 +75,139 @@ async def create_post(
 async def delete_post(
     post_id: UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user_from_token),
-) -> PostDeleteResponse:
+    current_user: Principal = Depends(get_current_user_from_token),
+) -> ModelResponse:
     #  вызывается функция удаления поста
     deleted_post_id = await _delete_post(post_id, current_user.user_id, db)
     if deleted_post_id is None:
         raise HTTPException(
             status_code=404, detail=f"Post with id {post_id} not found."
         )
-    return PostDeleteResponse(deleted_post_id=deleted_post_id)
+    return ModelResponse(PostDeleteResponse(deleted_post_id=deleted_post_id))
 
 
 #  получение поста по id
 @post_router.get("/", response_model=ShowPost)
 async def get_post_by_id(
     post_id: UUID,
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user_from_token),
-) -> ShowPost:
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user_from_token),
+) -> ModelResponse:
+    #  условный запрос проверяется по версии поста без загрузки текста
+    if if_none_match is not None:
+        etag = await _get_post_etag(post_id, db)
+        if etag is not None and etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
     #  вызывается функция получения поста по id
     post = await _get_post_by_id(post_id, db)
     if post is None:
         raise HTTPException(
             status_code=404, detail=f"Post with id {post_id} not found."
         )
-    return post
+    return ModelResponse(post, headers={"ETag": _show_post_etag(post)})
+
+
+#  получение постов по списку id одним запросом
+@post_router.get("/batch", response_model=PostBatch)
+async def get_posts_batch(
+    ids: List[UUID] = Query(..., min_items=1, max_items=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user_from_token),
+) -> ModelResponse:
+    #  вызывается функция получения постов по списку id
+    return ModelResponse(await _get_posts_batch(ids, db))
+
+
+#  реакции текущего пользователя на посты по списку id одним запросом
+@post_router.get("/reactions", response_model=ViewerReactions)
+async def get_viewer_reactions(
+    ids: List[UUID] = Query(..., min_items=1, max_items=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user_from_token),
+) -> ModelResponse:
+    #  вызывается функция получения реакций пользователя
+    return ModelResponse(
+        await _get_viewer_reactions(ids, current_user.user_id, db)
+    )
+
+
+#  получение ленты постов с keyset-пагинацией
+@post_router.get("/feed", response_model=PostFeed)
+async def get_feed(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user_from_token),
+) -> ModelResponse:
+    try:
+        #  вызывается функция получения страницы ленты
+        feed = await _get_feed(limit=limit, cursor=cursor, session=db)
+    except InvalidCursor as err:
+        raise HTTPException(status_code=422, detail=str(err))
+    return ModelResponse(feed)
+
+
+#  получение домашней ленты текущего пользователя
+@post_router.get("/timeline", response_model=PostFeed)
+async def get_home_timeline(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user_from_token),
+) -> ModelResponse:
+    try:
+        #  вызывается функция получения домашней ленты
+        feed = await _get_home_timeline(
+            user_id=current_user.user_id, limit=limit, cursor=cursor, session=db
+        )
+    except InvalidCursor as err:
+        raise HTTPException(status_code=422, detail=str(err))
+    return ModelResponse(feed)
+
+
+#  посты в трендах; ответ собирается в памяти без обращения к базе
+@post_router.get("/trending", response_model=TrendingPage)
+async def get_trending_posts(
+    limit: int = Query(20, ge=1, le=settings.TRENDING_TOP_SIZE),
+    current_user: Principal = Depends(get_current_user_from_token),
+) -> Response:
+    return Response(
+        content=trending_posts.render(limit), media_type="application/json"
+    )
+
+
+#  потоковая выгрузка всех постов пользователя в NDJSON, по умолчанию - своих
+@post_router.get("/export")
+async def export_posts(
+    user_id: Optional[UUID] = None,
+    current_user: Principal = Depends(get_current_user_from_token),
+) -> StreamingResponse:
+    author_id = user_id or current_user.user_id
+    return StreamingResponse(
+        _export_user_posts(author_id),
+        media_type="application/x-ndjson",
+        headers={
+            "Content-Disposition": f'attachment; filename="posts-{author_id}.ndjson"'
+        },
+    )
+
+
+#  полнотекстовый поиск постов
+@post_router.get("/search", response_model=PostSearchPage)
+async def search_posts(
+    q: str = Query(..., min_length=1, max_length=settings.POST_SEARCH_MAX_QUERY_LENGTH),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user_from_token),
+) -> ModelResponse:
+    try:
+        #  вызывается функция поиска постов
+        page = await _search_posts(query=q, limit=limit, cursor=cursor, session=db)
+    except InvalidCursor as err:
+        raise HTTPException(status_code=422, detail=str(err))
+    return ModelResponse(page)
 
 
 #  обновление поста
@@ -85,8 +216,8 @@ async def update_post_by_id(
     post_id: UUID,
     body: UpdatePostReuest,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user_from_token),
-) -> UpdatedPostResponse:
+    current_user: Principal = Depends(get_current_user_from_token),
+) -> ModelResponse:
     updated_post_params = body.dict(exclude_none=True)
     #  проверка переданы ли какие-то параметры для изменения поста
     if updated_post_params == {}:
@@ -111,7 +242,7 @@ async def update_post_by_id(
     except IntegrityError as err:
         logger.error(err)
         raise HTTPException(status_code=503, detail=f"Database error: {err}")
-    return UpdatedPostResponse(updated_post_id=updated_post_id)
+    return ModelResponse(UpdatedPostResponse(updated_post_id=updated_post_id))
 
 
 # лайк посту
@@ -119,9 +250,17 @@ async def update_post_by_id(
 async def like_post(
     post_id: UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user_from_token),
+    current_user: Principal = Depends(get_current_user_from_token),
 ) -> bool:
     try:
+        #  при пакетной записи реакция ставится в очередь и считается принятой
+        if settings.REACTION_INGESTION_ENABLED:
+            return _enqueue_reaction(
+                kind=LIKE,
+                post_id=post_id,
+                user_id=current_user.user_id,
+                added=True,
+            )
         #  вызывается функция создания лайка
         return await _like_post(
             post_id=post_id, user_id=current_user.user_id, session=db
@@ -129,6 +268,8 @@ async def like_post(
     except IntegrityError as err:
         logger.error(err)
         raise HTTPException(status_code=503, detail=f"Database error: {err}")
+    except ReactionQueueFull as err:
+        raise HTTPException(status_code=503, detail=str(err))
 
 
 # убрать лайк посту
@@ -136,9 +277,17 @@ async def like_post(
 async def remove_like_post(
     post_id: UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user_from_token),
+    current_user: Principal = Depends(get_current_user_from_token),
 ) -> bool:
     try:
+        #  при пакетной записи реакция ставится в очередь и считается принятой
+        if settings.REACTION_INGESTION_ENABLED:
+            return _enqueue_reaction(
+                kind=LIKE,
+                post_id=post_id,
+                user_id=current_user.user_id,
+                added=False,
+            )
         #  вызывается функция удаления лайка
         return await _remove_like_post(
             post_id=post_id, user_id=current_user.user_id, session=db
@@ -146,6 +295,8 @@ async def remove_like_post(
     except IntegrityError as err:
         logger.error(err)
         raise HTTPException(status_code=503, detail=f"Database error: {err}")
+    except ReactionQueueFull as err:
+        raise HTTPException(status_code=503, detail=str(err))
 
 
 # дизлайк посту
@@ -153,9 +304,17 @@ async def remove_like_post(
 async def dislike_post(
     post_id: UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user_from_token),
+    current_user: Principal = Depends(get_current_user_from_token),
 ) -> bool:
     try:
+        #  при пакетной записи реакция ставится в очередь и считается принятой
+        if settings.REACTION_INGESTION_ENABLED:
+            return _enqueue_reaction(
+                kind=DISLIKE,
+                post_id=post_id,
+                user_id=current_user.user_id,
+                added=True,
+            )
         #  вызывается функция создания/удаления дизлайка
         return await _dislike_post(
             post_id=post_id, user_id=current_user.user_id, session=db
@@ -163,6 +322,8 @@ async def dislike_post(
     except IntegrityError as err:
         logger.error(err)
         raise HTTPException(status_code=503, detail=f"Database error: {err}")
+    except ReactionQueueFull as err:
+        raise HTTPException(status_code=503, detail=str(err))
 
 
 # убрать  дизлайк посту
@@ -170,9 +331,17 @@ async def dislike_post(
 async def remove_dislike_post(
     post_id: UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user_from_token),
+    current_user: Principal = Depends(get_current_user_from_token),
 ) -> bool:
     try:
+        #  при пакетной записи реакция ставится в очередь и считается принятой
+        if settings.REACTION_INGESTION_ENABLED:
+            return _enqueue_reaction(
+                kind=DISLIKE,
+                post_id=post_id,
+                user_id=current_user.user_id,
+                added=False,
+            )
         #  вызывается функция создания/удаления дизлайка
         return await _remove_dislike_post(
             post_id=post_id, user_id=current_user.user_id, session=db
@@ -180,3 +349,5 @@ async def remove_dislike_post(
     except IntegrityError as err:
         logger.error(err)
         raise HTTPException(status_code=503, detail=f"Database error: {err}")
+    except ReactionQueueFull as err:
+        raise HTTPException(status_code=503, detail=str(err))
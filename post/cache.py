@@ -0,0 +1,93 @@
+from typing import Awaitable, Callable, Iterable, Optional, Tuple, Union
+from uuid import UUID, uuid4
+
+import settings
+from cache import MemoryCacheBackend, RedisCacheBackend
+
+from .schemas import ShowPost
+
+#  пустое значение в кэше означает, что поста нет
+MISSING_POST = b""
+#  версия хранится дольше любой записи поста, чтобы старые записи не стали снова видны
+VERSION_TTL_SECONDS = 24 * 60 * 60
+
+
+class PostCache:
+    """Read-through cache of serialized posts with per-post version stamps"""
+
+    def __init__(
+        self,
+        backend: Union[MemoryCacheBackend, RedisCacheBackend],
+        ttl: float,
+        negative_ttl: float,
+    ):
+        self.backend = backend
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+    @staticmethod
+    def _version_key(post_id: UUID) -> str:
+        return f"post:{post_id}:version"
+
+    #  получение текущей версии поста; отсутствующая версия создаётся случайной,
+    #  поэтому записи прежних версий никогда не совпадут с новыми
+    async def _get_version(self, post_id: UUID) -> str:
+        version_key = self._version_key(post_id)
+        version = await self.backend.get(version_key)
+        if version is None:
+            new_version = uuid4().hex.encode()
+            if await self.backend.add(version_key, new_version, VERSION_TTL_SECONDS):
+                version = new_version
+            else:
+                version = await self.backend.get(version_key) or new_version
+        return version.decode()
+
+    #  чтение поста только из кэша: (найден ли в кэше, пост)
+    async def get(self, post_id: UUID) -> Tuple[bool, Optional[ShowPost]]:
+        key = f"post:{post_id}:{await self._get_version(post_id)}"
+        payload = await self.backend.get(key)
+        if payload is None:
+            return False, None
+        return True, None if payload == MISSING_POST else ShowPost.parse_raw(payload)
+
+    #  получение поста из кэша или загрузка через loader
+    async def get_or_load(
+        self, post_id: UUID, loader: Callable[[], Awaitable[Optional[ShowPost]]]
+    ) -> Optional[ShowPost]:
+        #  запись сохраняется под версией, прочитанной до загрузки: если пост
+        #  изменится во время загрузки, запись окажется под устаревшей версией
+        key = f"post:{post_id}:{await self._get_version(post_id)}"
+        payload = await self.backend.get(key)
+        if payload is not None:
+            return None if payload == MISSING_POST else ShowPost.parse_raw(payload)
+        post = await loader()
+        if post is None:
+            await self.backend.set(key, MISSING_POST, self.negative_ttl)
+        else:
+            await self.backend.set(key, post.json().encode(), self.ttl)
+        return post
+
+    #  смена версии делает недоступными все закэшированные записи постов
+    async def invalidate(self, post_ids: Iterable[UUID]) -> None:
+        await self.backend.set_many(
+            {self._version_key(post_id): uuid4().hex.encode() for post_id in post_ids},
+            VERSION_TTL_SECONDS,
+        )
+
+
+#  создание кэша постов по настройкам; None - кэш выключен
+def create_post_cache() -> Optional[PostCache]:
+    if settings.POST_CACHE_BACKEND == "memory":
+        backend = MemoryCacheBackend(max_size=settings.POST_CACHE_MAX_SIZE)
+    elif settings.POST_CACHE_BACKEND == "redis":
+        backend = RedisCacheBackend(url=settings.POST_CACHE_URL)
+    else:
+        return None
+    return PostCache(
+        backend=backend,
+        ttl=settings.POST_CACHE_TTL_SECONDS,
+        negative_ttl=settings.POST_CACHE_NEGATIVE_TTL_SECONDS,
+    )
+
+
+post_cache = create_post_cache()
@@ -0,0 +1,83 @@
+import asyncio
+from logging import getLogger
+from typing import Dict, List, Optional
+from uuid import UUID
+
+import settings
+from session import async_session
+
+from .dals import PostDAL
+
+logger = getLogger(__name__)
+
+
+class ReactionCounterBuffer:
+    """Accumulates like/dislike count deltas in memory and writes them in batches"""
+
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._deltas: Dict[UUID, List[int]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    #  накопление приращения счётчиков поста
+    def add(self, post_id: UUID, likes: int = 0, dislikes: int = 0) -> None:
+        delta = self._deltas.setdefault(post_id, [0, 0])
+        delta[0] += likes
+        delta[1] += dislikes
+
+    #  запись накопленных приращений в базу пачками; кэш постов не сбрасывается:
+    #  у самых популярных постов счётчики меняются постоянно, и сброс на каждой
+    #  записи лишил бы их кэша, поэтому счётчики в кэше отстают не дольше его TTL
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            deltas, self._deltas = self._deltas, {}
+            #  сортировка по id задаёт одинаковый порядок блокировок строк
+            rows = sorted(
+                (post_id, likes, dislikes)
+                for post_id, (likes, dislikes) in deltas.items()
+                if likes or dislikes
+            )
+            written = 0
+            try:
+                for start in range(0, len(rows), self.batch_size):
+                    batch = rows[start : start + self.batch_size]
+                    async with async_session() as session:
+                        async with session.begin():
+                            await PostDAL(session).apply_reaction_count_deltas(batch)
+                    written += len(batch)
+            except Exception:
+                #  незаписанные приращения возвращаются в буфер до следующей попытки
+                for post_id, likes, dislikes in rows[written:]:
+                    self.add(post_id, likes=likes, dislikes=dislikes)
+                raise
+            return written
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as err:
+                logger.error(err)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+reaction_counters = ReactionCounterBuffer(
+    interval=settings.REACTION_COUNTER_FLUSH_INTERVAL_SECONDS,
+    batch_size=settings.REACTION_COUNTER_FLUSH_BATCH_SIZE,
+)
@@ -0,0 +1,38 @@
+import base64
+import datetime
+import uuid
+from typing import Tuple
+
+import orjson
+
+
+class InvalidCursor(ValueError):
+    """Курсор пагинации не удалось разобрать"""
+
+
+#  кодирование позиции keyset-пагинации в непрозрачный токен
+def encode_cursor(*values) -> str:
+    raw = orjson.dumps(
+        [v.isoformat() if isinstance(v, datetime.datetime) else str(v) for v in values]
+    )
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+#  декодирование токена курсора ленты в пару (time_created, id)
+def decode_feed_cursor(cursor: str) -> Tuple[datetime.datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        time_created, post_id = orjson.loads(raw)
+        return datetime.datetime.fromisoformat(time_created), uuid.UUID(post_id)
+    except (ValueError, TypeError) as err:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from err
+
+
+#  декодирование токена курсора поиска в пару (rank, id)
+def decode_search_cursor(cursor: str) -> Tuple[float, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        rank, post_id = orjson.loads(raw)
+        return float(rank), uuid.UUID(post_id)
+    except (ValueError, TypeError) as err:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from err
@@ -1,10 +1,329 @@
-from typing import Union
+import datetime
+from typing import List, Optional, Tuple, Union
 from uuid import UUID
 
-from sqlalchemy import and_, delete, select, update
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import (
+    REAL,
+    Float,
+    Integer,
+    Table,
+    Text,
+    and_,
+    any_,
+    bindparam,
+    cast,
+    column,
+    delete,
+    func,
+    literal,
+    select,
+    true,
+    tuple_,
+    union_all,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, REGCONFIG, UUID as UUID_TYPE
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncResult, AsyncSession
 
-from .models import Post, post_like_table, post_dislike_table
+import settings
+from precompiled import precompile
+from user.models import User, follow_table
+from .models import Post, home_timeline_table, post_like_table, post_dislike_table
+
+#  запросы горячих путей собираются один раз при импорте: SQLAlchemy
+#  кэширует их скомпилированный SQL, а asyncpg держит подготовленный запрос
+#  на каждом соединении (DB_STATEMENT_CACHE_SIZE); значения передаются параметрами.
+#  В INSERT/UPDATE имена колонок зарезервированы, поэтому параметры там с префиксом b_
+select_post_by_id = select(Post).where(Post.id == bindparam("post_id"))
+select_post_version = select(
+    Post.time_updated, Post.like_count, Post.dislike_count
+).where(Post.id == bindparam("post_id"))
+#  = ANY(:post_ids) даёт один и тот же текст запроса для любого числа id
+select_posts_by_ids = select(Post).where(
+    Post.id == any_(bindparam("post_ids", type_=ARRAY(UUID_TYPE(as_uuid=True))))
+)
+
+
+#  реакции пользователя на список постов: обе части читают только индексы
+#  (user_id, post_id), без обращения к строкам таблиц
+def _viewer_reaction_query(table: Table, kind: str):
+    return select(table.c.post_id, literal(kind).label("kind")).where(
+        and_(
+            table.c.user_id == bindparam("user_id", type_=UUID_TYPE(as_uuid=True)),
+            table.c.post_id
+            == any_(bindparam("post_ids", type_=ARRAY(UUID_TYPE(as_uuid=True)))),
+        )
+    )
+
+
+select_viewer_reactions = union_all(
+    _viewer_reaction_query(post_like_table, "like"),
+    _viewer_reaction_query(post_dislike_table, "dislike"),
+)
+
+
+#  сравнение кортежей с курсором (time_created, id) последней строки страницы
+def _after_cursor(time_created_column, id_column):
+    return tuple_(time_created_column, id_column) < tuple_(
+        bindparam("after_time_created", type_=Post.time_created.type),
+        bindparam("after_id", type_=UUID_TYPE(as_uuid=True)),
+    )
+
+
+#  страница ленты; сравнение кортежей использует индекс ix_posts_time_created_id
+def _feed_query(after_cursor: bool):
+    query = select(Post).order_by(Post.time_created.desc(), Post.id.desc())
+    if after_cursor:
+        query = query.where(_after_cursor(Post.time_created, Post.id))
+    return query.limit(bindparam("limit", type_=Integer))
+
+
+#  страница домашней ленты пользователя
+def _home_timeline_query(after_cursor: bool):
+    user_id = bindparam("user_id", type_=UUID_TYPE(as_uuid=True))
+    limit = bindparam("limit", type_=Integer)
+    #  посты, разосланные в ленту при создании
+    pushed = select(
+        home_timeline_table.c.post_id, home_timeline_table.c.time_created
+    ).where(home_timeline_table.c.user_id == user_id)
+    #  посты авторов с большим числом подписчиков читаются напрямую
+    pulled = (
+        select(Post.id, Post.time_created)
+        .join(follow_table, follow_table.c.followee_id == Post.user_id)
+        .join(User, User.user_id == Post.user_id)
+        .where(
+            and_(
+                follow_table.c.follower_id == user_id,
+                User.follower_count > bindparam("max_followers", type_=Integer),
+            )
+        )
+    )
+    if after_cursor:
+        pushed = pushed.where(
+            _after_cursor(home_timeline_table.c.time_created, home_timeline_table.c.post_id)
+        )
+        pulled = pulled.where(_after_cursor(Post.time_created, Post.id))
+    pushed = pushed.order_by(
+        home_timeline_table.c.time_created.desc(),
+        home_timeline_table.c.post_id.desc(),
+    ).limit(limit)
+    pulled = pulled.order_by(Post.time_created.desc(), Post.id.desc()).limit(limit)
+    #  UNION убирает дубли постов, попавших в ленту до того,
+    #  как у автора стало много подписчиков
+    page = pushed.union(pulled).subquery()
+    return (
+        select(Post)
+        .join(page, page.c.post_id == Post.id)
+        .order_by(page.c.time_created.desc(), page.c.post_id.desc())
+        .limit(limit)
+    )
+
+
+#  страница результатов поиска, отсортированная по релевантности
+def _search_query(after_cursor: bool):
+    config = cast(literal(settings.POST_SEARCH_CONFIG), REGCONFIG)
+    #  websearch_to_tsquery не падает на синтаксисе пользовательского запроса
+    ts_query = func.websearch_to_tsquery(config, bindparam("query", type_=Text))
+    #  нормализация 1 делит ранг на логарифм длины, чтобы длинные тексты с
+    #  повторами слова не вытесняли совпадения в заголовке
+    rank = func.ts_rank(Post.search_vector, ts_query, 1)
+    matches = (
+        select(Post.id, rank.label("rank"))
+        .where(Post.search_vector.bool_op("@@")(ts_query))
+        .subquery()
+    )
+    page = select(matches.c.id, matches.c.rank)
+    if after_cursor:
+        page = page.where(
+            tuple_(matches.c.rank, matches.c.id)
+            < tuple_(
+                bindparam("after_rank", type_=REAL),
+                bindparam("after_id", type_=UUID_TYPE(as_uuid=True)),
+            )
+        )
+    page = (
+        page.order_by(matches.c.rank.desc(), matches.c.id.desc())
+        .limit(bindparam("limit", type_=Integer))
+        .subquery()
+    )
+    #  фрагмент с подсветкой строится только для постов страницы
+    #  и только по началу текста
+    headline = func.ts_headline(
+        config,
+        func.left(Post.text, settings.POST_SEARCH_HEADLINE_MAX_LENGTH),
+        ts_query,
+        "MaxFragments=2, MaxWords=30, MinWords=10",
+    )
+    return (
+        select(Post, page.c.rank, headline.label("headline"))
+        .join(page, page.c.id == Post.id)
+        .order_by(page.c.rank.desc(), page.c.id.desc())
+    )
+
+
+#  добавление реакции: INSERT ... SELECT отбрасывает несуществующие и собственные
+#  посты, ON CONFLICT делает повторную реакцию идемпотентной
+def _add_reaction_query(table: Table):
+    user_id = bindparam("b_user_id", type_=UUID_TYPE(as_uuid=True))
+    return precompile(
+        insert(table)
+        .from_select(
+            ["post_id", "user_id"],
+            select(Post.id, user_id).where(
+                and_(Post.id == bindparam("b_post_id"), Post.user_id != user_id)
+            ),
+        )
+        .on_conflict_do_nothing(index_elements=["post_id", "user_id"])
+        .returning(table.c.post_id)
+    )
+
+
+#  удаление реакции
+def _remove_reaction_query(table: Table):
+    return (
+        delete(table)
+        .where(
+            and_(
+                table.c.post_id == bindparam("post_id"),
+                table.c.user_id == bindparam("user_id"),
+            )
+        )
+        .returning(table.c.post_id)
+    )
+
+
+#  рассылка поста в домашние ленты подписчиков; авторы с большим числом
+#  подписчиков не рассылаются, их посты подмешиваются в ленту при чтении
+push_post_to_timelines_query = precompile(
+    insert(home_timeline_table).from_select(
+        ["user_id", "post_id", "time_created"],
+        select(follow_table.c.follower_id, Post.id, Post.time_created)
+        .join(follow_table, follow_table.c.followee_id == Post.user_id)
+        .join(User, User.user_id == Post.user_id)
+        .where(
+            and_(
+                Post.id == bindparam("b_post_id", type_=UUID_TYPE(as_uuid=True)),
+                User.follower_count <= bindparam("max_followers", type_=Integer),
+            )
+        ),
+    )
+)
+#  пачка пользователей для обрезки лент по порядку user_id
+select_timeline_users = (
+    select(User.user_id)
+    .where(User.user_id > bindparam("after_user_id", type_=UUID_TYPE(as_uuid=True)))
+    .order_by(User.user_id)
+    .limit(bindparam("limit", type_=Integer))
+)
+#  для каждого пользователя пачки граница - запись с номером max_length + 1,
+#  найденная по индексу ленты; удаляется она и всё, что старше
+_trimmed_users = (
+    select(User.user_id)
+    .where(
+        User.user_id
+        == any_(bindparam("user_ids", type_=ARRAY(UUID_TYPE(as_uuid=True))))
+    )
+    .subquery()
+)
+_trim_cutoff = (
+    select(home_timeline_table.c.time_created, home_timeline_table.c.post_id)
+    .where(home_timeline_table.c.user_id == _trimmed_users.c.user_id)
+    .order_by(
+        home_timeline_table.c.time_created.desc(),
+        home_timeline_table.c.post_id.desc(),
+    )
+    .offset(bindparam("max_length", type_=Integer))
+    .limit(1)
+    .lateral()
+)
+_trim_cutoffs = (
+    select(
+        _trimmed_users.c.user_id,
+        _trim_cutoff.c.time_created,
+        _trim_cutoff.c.post_id,
+    )
+    .select_from(_trimmed_users.join(_trim_cutoff, true()))
+    .subquery()
+)
+trim_timelines_query = delete(home_timeline_table).where(
+    and_(
+        home_timeline_table.c.user_id == _trim_cutoffs.c.user_id,
+        tuple_(home_timeline_table.c.time_created, home_timeline_table.c.post_id)
+        <= tuple_(_trim_cutoffs.c.time_created, _trim_cutoffs.c.post_id),
+    )
+)
+search_posts_query = _search_query(after_cursor=False)
+search_posts_after_query = _search_query(after_cursor=True)
+#  кандидаты в тренды: недавние посты с перевесом лайков, лучшие по hot score
+#  (та же формула, что и в post.trending.hot_score; log в PostgreSQL - десятичный)
+_net_likes = Post.like_count - Post.dislike_count
+select_trending_candidates = (
+    select(
+        Post.id,
+        Post.user_id,
+        Post.title,
+        Post.time_created,
+        Post.like_count,
+        Post.dislike_count,
+    )
+    .where(
+        and_(
+            Post.time_created > bindparam("since", type_=Post.time_created.type),
+            Post.like_count > Post.dislike_count,
+        )
+    )
+    .order_by(
+        (
+            func.log(func.greatest(_net_likes, 1))
+            + func.extract("epoch", Post.time_created)
+            / bindparam("decay_seconds", type_=Float)
+        ).desc()
+    )
+    .limit(bindparam("limit", type_=Integer))
+)
+
+
+#  окно выгрузки постов автора от старых к новым; сравнение кортежей
+#  использует индекс ix_posts_user_id_time_created_id
+def _export_query(after_cursor: bool):
+    query = select(
+        Post.id,
+        Post.user_id,
+        Post.title,
+        Post.text,
+        Post.time_created,
+        Post.time_updated,
+        Post.like_count,
+        Post.dislike_count,
+    ).where(Post.user_id == bindparam("user_id", type_=UUID_TYPE(as_uuid=True)))
+    if after_cursor:
+        query = query.where(
+            tuple_(Post.time_created, Post.id)
+            > tuple_(
+                bindparam("after_time_created", type_=Post.time_created.type),
+                bindparam("after_id", type_=UUID_TYPE(as_uuid=True)),
+            )
+        )
+    return query.order_by(Post.time_created, Post.id).limit(
+        bindparam("limit", type_=Integer)
+    )
+
+
+select_export = _export_query(after_cursor=False)
+select_export_after = _export_query(after_cursor=True)
+select_feed = _feed_query(after_cursor=False)
+select_feed_after = _feed_query(after_cursor=True)
+select_home_timeline = _home_timeline_query(after_cursor=False)
+select_home_timeline_after = _home_timeline_query(after_cursor=True)
+add_reaction_queries = {
+    table: _add_reaction_query(table) for table in (post_like_table, post_dislike_table)
+}
+remove_reaction_queries = {
+    table: _remove_reaction_query(table)
+    for table in (post_like_table, post_dislike_table)
+}
 
 
 class PostDAL:
@@ -22,8 +341,7 @@ class PostDAL:
 
     # Удаление поста
     async def delete_post(self, post_id: UUID, author_id: UUID) -> Union[UUID, dict]:
-        query = select(Post).where(Post.id == post_id)
-        result = await self.db_session.execute(query)
+        result = await self.db_session.execute(select_post_by_id, {"post_id": post_id})
         post = result.scalar_one_or_none()
         if post is None:
             return {"error": f"Post with id {post_id} does not exist"}
@@ -39,17 +357,174 @@ class PostDAL:
 
     # Получение поста по id
     async def get_post_by_id(self, post_id: UUID) -> Union[Post, None]:
-        query = select(Post).where(Post.id == post_id)
-        res = await self.db_session.execute(query)
+        res = await self.db_session.execute(select_post_by_id, {"post_id": post_id})
         post_row = res.fetchone()
         if post_row is not None:
             return post_row[0]
 
+    # Получение полей поста, от которых зависит его ETag
+    async def get_post_version(self, post_id: UUID):
+        res = await self.db_session.execute(select_post_version, {"post_id": post_id})
+        return res.fetchone()
+
+    # Получение постов по списку id одним запросом
+    async def get_posts_by_ids(self, post_ids: List[UUID]) -> List[Post]:
+        res = await self.db_session.execute(select_posts_by_ids, {"post_ids": post_ids})
+        return list(res.scalars())
+
+    # Получение реакций пользователя на посты из списка одним запросом
+    async def get_viewer_reactions(
+        self, user_id: UUID, post_ids: List[UUID]
+    ) -> List[Tuple[UUID, str]]:
+        res = await self.db_session.execute(
+            select_viewer_reactions, {"user_id": user_id, "post_ids": post_ids}
+        )
+        return [tuple(row) for row in res]
+
+    # Получение страницы ленты постов, отсортированной от новых к старым
+    async def get_feed(
+        self,
+        limit: int,
+        after_time_created: Optional[datetime.datetime] = None,
+        after_id: Optional[UUID] = None,
+    ) -> List[Post]:
+        if after_time_created is not None and after_id is not None:
+            res = await self.db_session.execute(
+                select_feed_after,
+                {
+                    "limit": limit,
+                    "after_time_created": after_time_created,
+                    "after_id": after_id,
+                },
+            )
+        else:
+            res = await self.db_session.execute(select_feed, {"limit": limit})
+        return list(res.scalars())
+
+    # Поиск постов, возвращает (пост, релевантность, фрагмент текста)
+    async def search_posts(
+        self,
+        query: str,
+        limit: int,
+        after_rank: Optional[float] = None,
+        after_id: Optional[UUID] = None,
+    ) -> List[Tuple[Post, float, str]]:
+        if after_rank is not None and after_id is not None:
+            res = await self.db_session.execute(
+                search_posts_after_query,
+                {
+                    "query": query,
+                    "limit": limit,
+                    "after_rank": after_rank,
+                    "after_id": after_id,
+                },
+            )
+        else:
+            res = await self.db_session.execute(
+                search_posts_query, {"query": query, "limit": limit}
+            )
+        return [tuple(row) for row in res]
+
+    # Получение кандидатов в тренды
+    async def get_trending_candidates(
+        self, since: datetime.datetime, decay_seconds: float, limit: int
+    ) -> List[tuple]:
+        res = await self.db_session.execute(
+            select_trending_candidates,
+            {"since": since, "decay_seconds": decay_seconds, "limit": limit},
+        )
+        return [tuple(row) for row in res]
+
+    # Потоковое чтение окна постов автора через курсор на сервере
+    async def stream_user_posts(
+        self,
+        user_id: UUID,
+        limit: int,
+        chunk_size: int,
+        after_time_created: Optional[datetime.datetime] = None,
+        after_id: Optional[UUID] = None,
+    ) -> AsyncResult:
+        params = {"user_id": user_id, "limit": limit}
+        query = select_export
+        if after_time_created is not None and after_id is not None:
+            params.update(after_time_created=after_time_created, after_id=after_id)
+            query = select_export_after
+        return await self.db_session.stream(
+            query, params, execution_options={"yield_per": chunk_size}
+        )
+
+    # Рассылка нового поста в домашние ленты подписчиков автора
+    async def push_post_to_timelines(self, post_id: UUID, max_followers: int) -> int:
+        res = await self.db_session.execute(
+            push_post_to_timelines_query,
+            {"b_post_id": post_id, "max_followers": max_followers},
+        )
+        return res.rowcount
+
+    # Заполнение ленты последними постами автора после подписки на него
+    async def backfill_timeline(
+        self, user_id: UUID, author_id: UUID, max_length: int
+    ) -> None:
+        query = (
+            insert(home_timeline_table)
+            .from_select(
+                ["user_id", "post_id", "time_created"],
+                select(literal(user_id, UUID_TYPE(as_uuid=True)), Post.id, Post.time_created)
+                .where(Post.user_id == author_id)
+                .order_by(Post.time_created.desc(), Post.id.desc())
+                .limit(max_length),
+            )
+            .on_conflict_do_nothing()
+        )
+        await self.db_session.execute(query)
+
+    # Удаление постов автора из ленты после отписки от него
+    async def remove_author_from_timeline(self, user_id: UUID, author_id: UUID) -> None:
+        query = delete(home_timeline_table).where(
+            and_(
+                home_timeline_table.c.user_id == user_id,
+                home_timeline_table.c.post_id.in_(
+                    select(Post.id).where(Post.user_id == author_id)
+                ),
+            )
+        )
+        await self.db_session.execute(query)
+
+    # Получение страницы домашней ленты пользователя
+    async def get_home_timeline(
+        self,
+        user_id: UUID,
+        limit: int,
+        max_followers: int,
+        after_time_created: Optional[datetime.datetime] = None,
+        after_id: Optional[UUID] = None,
+    ) -> List[Post]:
+        params = {"user_id": user_id, "limit": limit, "max_followers": max_followers}
+        if after_time_created is not None and after_id is not None:
+            params.update(after_time_created=after_time_created, after_id=after_id)
+            res = await self.db_session.execute(select_home_timeline_after, params)
+        else:
+            res = await self.db_session.execute(select_home_timeline, params)
+        return list(res.scalars())
+
+    # Получение следующей пачки пользователей для обрезки лент
+    async def get_timeline_users(self, after_user_id: UUID, limit: int) -> List[UUID]:
+        res = await self.db_session.execute(
+            select_timeline_users, {"after_user_id": after_user_id, "limit": limit}
+        )
+        return list(res.scalars())
+
+    # Обрезка домашних лент пользователей до максимальной длины
+    async def trim_timelines(self, user_ids: List[UUID], max_length: int) -> int:
+        res = await self.db_session.execute(
+            trim_timelines_query, {"user_ids": user_ids, "max_length": max_length}
+        )
+        return res.rowcount
+
     async def update_post(
         self, post_id: UUID, author_id: UUID, **kwargs
     ) -> Union[UUID, dict]:
-        query = select(Post).where(Post.id == post_id)
-        result = await self.db_session.execute(query)
+        result = await self.db_session.execute(select_post_by_id, {"post_id": post_id})
         post = result.scalar_one_or_none()
         if post is None:
             return {"error": f"Post with id {post_id} does not exist"}
@@ -68,94 +543,101 @@ class PostDAL:
         if update_post_id_row is not None:
             return update_post_id_row[0]
 
-    # Пример добавления лайка к посту
-    async def add_like_to_post(self, post_id, user_id) -> bool:
-        query = select(Post).where(Post.id == post_id)
-        result = await self.db_session.execute(query)
-        #  проверка не является ли пост собственным
-        post = result.scalar_one_or_none()
-        if post is None or post.user_id == user_id:
-            return False
-        # Проверяем, существует ли запись о лайке данного пользователя на указанный пост
-        query = select(post_like_table).where(
-            (post_like_table.c.post_id == post_id)
-            & (post_like_table.c.user_id == user_id)
-        )
-        result = await self.db_session.execute(query)
-        existing_like = result.scalar_one_or_none()
-
-        if existing_like is None:
-            await self.db_session.execute(
-                post_like_table.insert().values(post_id=post_id, user_id=user_id)
+    # Применение накопленных приращений счётчиков лайков и дизлайков
+    async def apply_reaction_count_deltas(
+        self, deltas: List[Tuple[UUID, int, int]]
+    ) -> None:
+        #  UPDATE ... FROM (VALUES ...) обновляет все посты пачки одним запросом
+        delta_values = values(
+            column("post_id", UUID_TYPE(as_uuid=True)),
+            column("likes", Integer),
+            column("dislikes", Integer),
+            name="deltas",
+        ).data(deltas)
+        query = (
+            update(Post)
+            .where(Post.id == delta_values.c.post_id)
+            .values(
+                like_count=Post.like_count + delta_values.c.likes,
+                dislike_count=Post.dislike_count + delta_values.c.dislikes,
+                #  изменение счётчиков не является редактированием поста
+                time_updated=Post.time_updated,
             )
-            await self.db_session.commit()  # Commit the changes
-            return True
-        return False
-
-        # Пример удаления лайка из поста
+            .execution_options(synchronize_session=False)
+        )
+        await self.db_session.execute(query)
 
-    async def remove_like_from_post(self, post_id, user_id) -> bool:
-        # Проверяем, существует ли запись о лайке данного пользователя на указанный пост
-        query = select(post_like_table).where(
-            (post_like_table.c.post_id == post_id)
-            & (post_like_table.c.user_id == user_id)
+    # Добавление реакции к посту одним запросом
+    async def _add_reaction(self, table: Table, post_id: UUID, user_id: UUID) -> bool:
+        res = await self.db_session.execute(
+            add_reaction_queries[table], {"b_post_id": post_id, "b_user_id": user_id}
         )
-        result = await self.db_session.execute(query)
-        existing_like = result.scalar_one_or_none()
-        print(f"Результат: {existing_like}")
-
-        if existing_like is not None:
-            await self.db_session.execute(
-                post_like_table.delete().where(
-                    (post_like_table.c.post_id == post_id)
-                    & (post_like_table.c.user_id == user_id)
-                )
-            )
-            await self.db_session.commit()  # Commit the changes
-            return True
-        return False
+        return res.fetchone() is not None
 
-    # Пример добавления дизлайка к посту
-    async def add_dislike_to_post(self, post_id, user_id) -> bool:
-        query = select(Post).where(Post.id == post_id)
-        result = await self.db_session.execute(query)
-        # проверка не является ли пост собственным
-        post = result.scalar_one_or_none()
-        if post is None or post.user_id == user_id:
-            return False
-        # Проверяем, существует ли запись о дизлайке данного пользователя на указанный пост
-        query = select(post_dislike_table).where(
-            (post_dislike_table.c.post_id == post_id)
-            & (post_dislike_table.c.user_id == user_id)
+    # Удаление реакции с поста одним запросом
+    async def _remove_reaction(self, table: Table, post_id: UUID, user_id: UUID) -> bool:
+        res = await self.db_session.execute(
+            remove_reaction_queries[table], {"post_id": post_id, "user_id": user_id}
         )
-        result = await self.db_session.execute(query)
-        existing_dislike = result.scalar_one_or_none()
+        return res.fetchone() is not None
 
-        if existing_dislike is None:
-            await self.db_session.execute(
-                post_dislike_table.insert().values(post_id=post_id, user_id=user_id)
+    # Добавление пачки реакций одним запросом, возвращает id постов с новыми реакциями
+    async def add_reactions(
+        self, table: Table, reactions: List[Tuple[UUID, UUID]]
+    ) -> List[UUID]:
+        reaction_values = values(
+            column("post_id", UUID_TYPE(as_uuid=True)),
+            column("user_id", UUID_TYPE(as_uuid=True)),
+            name="reactions",
+        ).data(reactions)
+        query = (
+            insert(table)
+            .from_select(
+                ["post_id", "user_id"],
+                select(reaction_values.c.post_id, reaction_values.c.user_id)
+                .join(Post, Post.id == reaction_values.c.post_id)
+                .where(Post.user_id != reaction_values.c.user_id),
             )
-            await self.db_session.commit()  # Commit the changes
-            return True
-        return False
-
-    # Пример удаления дизлайка из поста
-    async def remove_dislike_from_post(self, post_id, user_id) -> bool:
-        # Проверяем, существует ли запись о дизлайке данного пользователя на указанный пост
-        query = select(post_dislike_table).where(
-            (post_dislike_table.c.post_id == post_id)
-            & (post_dislike_table.c.user_id == user_id)
+            .on_conflict_do_nothing(index_elements=["post_id", "user_id"])
+            .returning(table.c.post_id)
         )
-        result = await self.db_session.execute(query)
-        existing_dislike = result.scalar_one_or_none()
+        res = await self.db_session.execute(query)
+        return list(res.scalars())
 
-        if existing_dislike is not None:
-            await self.db_session.execute(
-                post_dislike_table.delete().where(
-                    (post_dislike_table.c.post_id == post_id)
-                    & (post_dislike_table.c.user_id == user_id)
+    # Удаление пачки реакций одним запросом, возвращает id постов с удалёнными реакциями
+    async def remove_reactions(
+        self, table: Table, reactions: List[Tuple[UUID, UUID]]
+    ) -> List[UUID]:
+        reaction_values = values(
+            column("post_id", UUID_TYPE(as_uuid=True)),
+            column("user_id", UUID_TYPE(as_uuid=True)),
+            name="reactions",
+        ).data(reactions)
+        query = (
+            delete(table)
+            .where(
+                and_(
+                    table.c.post_id == reaction_values.c.post_id,
+                    table.c.user_id == reaction_values.c.user_id,
                 )
             )
-            await self.db_session.commit()  # Commit the changes
-            return True
-        return False
+            .returning(table.c.post_id)
+        )
+        res = await self.db_session.execute(query)
+        return list(res.scalars())
+
+    # Добавление лайка к посту
+    async def add_like_to_post(self, post_id: UUID, user_id: UUID) -> bool:
+        return await self._add_reaction(post_like_table, post_id, user_id)
+
+    # Удаление лайка с поста
+    async def remove_like_from_post(self, post_id: UUID, user_id: UUID) -> bool:
+        return await self._remove_reaction(post_like_table, post_id, user_id)
+
+    # Добавление дизлайка к посту
+    async def add_dislike_to_post(self, post_id: UUID, user_id: UUID) -> bool:
+        return await self._add_reaction(post_dislike_table, post_id, user_id)
+
+    # Удаление дизлайка с поста
+    async def remove_dislike_from_post(self, post_id: UUID, user_id: UUID) -> bool:
+        return await self._remove_reaction(post_dislike_table, post_id, user_id)
@@ -0,0 +1,195 @@
+import asyncio
+from logging import getLogger
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from uuid import UUID
+
+import settings
+from metrics import Counter, registry
+from session import async_session
+
+from .counters import reaction_counters
+from .dals import PostDAL
+from .models import post_dislike_table, post_like_table
+from .trending import trending_posts
+
+logger = getLogger(__name__)
+
+LIKE = "like"
+DISLIKE = "dislike"
+
+REACTION_TABLES = {LIKE: post_like_table, DISLIKE: post_dislike_table}
+COUNTER_FIELDS = {LIKE: "likes", DISLIKE: "dislikes"}
+#  попытки записи пачки после остановки приёма реакций, дальше она теряется
+STOP_WRITE_ATTEMPTS = 3
+
+reaction_batch_failures_total = registry.register(
+    Counter(
+        "reaction_batch_failures_total", "Failed attempts to write a reaction batch"
+    )
+)
+reaction_events_dropped_total = registry.register(
+    Counter(
+        "reaction_events_dropped_total",
+        "Accepted reactions lost because their batch could not be written on shutdown",
+    )
+)
+
+
+class ReactionEvent(NamedTuple):
+    """Реакция пользователя, ожидающая записи в базу"""
+
+    kind: str
+    post_id: UUID
+    user_id: UUID
+    added: bool
+
+
+class ReactionQueueFull(Exception):
+    """Очередь реакций переполнена или не принимает новые реакции"""
+
+
+#  схлопывание повторных и взаимно отменяющих реакций внутри пачки
+def coalesce_reactions(
+    events: Iterable[ReactionEvent],
+) -> Dict[Tuple[str, UUID, UUID], bool]:
+    #  итоговое состояние определяется последним событием пары пост-пользователь
+    final_state = {}
+    for event in events:
+        final_state[(event.kind, event.post_id, event.user_id)] = event.added
+    return final_state
+
+
+class ReactionIngestor:
+    """Queues reactions in memory and writes them with one statement per batch"""
+
+    def __init__(
+        self,
+        max_queue_size: int,
+        batch_size: int,
+        max_latency: float,
+        retry_delay: float,
+        max_retry_delay: float,
+    ):
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._accepting = False
+
+    #  постановка реакции в очередь
+    def submit(self, event: ReactionEvent) -> None:
+        if not self._accepting:
+            raise ReactionQueueFull("Reaction queue is not accepting reactions")
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            raise ReactionQueueFull("Reaction queue is full")
+
+    #  сбор пачки: до batch_size реакций или до истечения max_latency
+    async def _collect_batch(self) -> List[ReactionEvent]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_latency
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    #  запись пачки реакций в базу
+    async def write_batch(self, batch: List[ReactionEvent]) -> None:
+        added: Dict[str, List[Tuple[UUID, UUID]]] = {LIKE: [], DISLIKE: []}
+        removed: Dict[str, List[Tuple[UUID, UUID]]] = {LIKE: [], DISLIKE: []}
+        for (kind, post_id, user_id), is_added in coalesce_reactions(batch).items():
+            (added if is_added else removed)[kind].append((post_id, user_id))
+
+        changed = {}
+        async with async_session() as session:
+            async with session.begin():
+                post_dal = PostDAL(session)
+                for kind, table in REACTION_TABLES.items():
+                    inserted, deleted = [], []
+                    if added[kind]:
+                        inserted = await post_dal.add_reactions(table, added[kind])
+                    if removed[kind]:
+                        deleted = await post_dal.remove_reactions(table, removed[kind])
+                    changed[kind] = (inserted, deleted)
+
+        #  счётчики меняются только для реально записанных реакций
+        for kind, (inserted, deleted) in changed.items():
+            for post_id in inserted:
+                reaction_counters.add(post_id, **{COUNTER_FIELDS[kind]: 1})
+                trending_posts.record_reaction(post_id, **{COUNTER_FIELDS[kind]: 1})
+            for post_id in deleted:
+                reaction_counters.add(post_id, **{COUNTER_FIELDS[kind]: -1})
+                trending_posts.record_reaction(post_id, **{COUNTER_FIELDS[kind]: -1})
+
+    #  запись пачки с повторами: реакции уже подтверждены клиентам, поэтому
+    #  пачка повторяется с растущей паузой, пока приём реакций не остановлен;
+    #  очередь тем временем заполняется и новые реакции получают 503
+    async def _write_with_retry(self, batch: List[ReactionEvent]) -> None:
+        delay = self.retry_delay
+        stop_attempts = 0
+        while True:
+            try:
+                await self.write_batch(batch)
+                return
+            except Exception:
+                reaction_batch_failures_total.inc()
+                logger.exception("Failed to write a batch of %d reactions", len(batch))
+            if not self._accepting:
+                stop_attempts += 1
+                if stop_attempts >= STOP_WRITE_ATTEMPTS:
+                    reaction_events_dropped_total.inc(amount=len(batch))
+                    logger.error("Dropped %d reactions on shutdown", len(batch))
+                    return
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_retry_delay)
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect_batch()
+            try:
+                await self._write_with_retry(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._task = asyncio.create_task(self._run())
+            self._accepting = True
+
+    #  остановка: новые реакции не принимаются, очередь дописывается до конца
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._accepting = False
+            await self._queue.join()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+reaction_ingestor = ReactionIngestor(
+    max_queue_size=settings.REACTION_QUEUE_MAX_SIZE,
+    batch_size=settings.REACTION_BATCH_MAX_SIZE,
+    max_latency=settings.REACTION_BATCH_MAX_LATENCY_MS / 1000,
+    retry_delay=settings.REACTION_BATCH_RETRY_DELAY_SECONDS,
+    max_retry_delay=settings.REACTION_BATCH_MAX_RETRY_DELAY_SECONDS,
+)
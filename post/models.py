@@ -1,9 +1,18 @@
 import uuid
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy import Text, String, DateTime
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy import Column, ForeignKey, Integer, Table
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
+from sqlalchemy import (
+    Column,
+    Computed,
+    ForeignKey,
+    Index,
+    Integer,
+    Table,
+    UniqueConstraint,
+)
+import settings
 from user.models import User
 from sqlalchemy.orm import declarative_base
 
@@ -14,6 +23,15 @@ post_like_table = Table(
     Base.metadata,
     Column("post_id", UUID, ForeignKey("posts.id")),
     Column("user_id", UUID, ForeignKey(User.user_id)),
+    #  один лайк пользователя на пост
+    UniqueConstraint("post_id", "user_id", name="uq_post_like_post_id_user_id"),
+)
+
+#  реакции пользователя на страницу постов читаются только из индекса
+Index(
+    "ix_post_like_user_id_post_id",
+    post_like_table.c.user_id,
+    post_like_table.c.post_id,
 )
 
 post_dislike_table = Table(
@@ -21,6 +39,32 @@ post_dislike_table = Table(
     Base.metadata,
     Column("post_id", UUID, ForeignKey("posts.id")),
     Column("user_id", UUID, ForeignKey(User.user_id)),
+    #  один дизлайк пользователя на пост
+    UniqueConstraint("post_id", "user_id", name="uq_post_dislike_post_id_user_id"),
+)
+
+Index(
+    "ix_post_dislike_user_id_post_id",
+    post_dislike_table.c.user_id,
+    post_dislike_table.c.post_id,
+)
+
+
+#  предрассчитанные домашние ленты: посты авторов, на которых подписан пользователь
+home_timeline_table = Table(
+    "home_timeline",
+    Base.metadata,
+    Column("user_id", UUID(as_uuid=True), ForeignKey(User.user_id), primary_key=True),
+    Column("post_id", UUID(as_uuid=True), ForeignKey("posts.id"), primary_key=True),
+    Column("time_created", DateTime(timezone=True), nullable=False),
+)
+
+#  чтение ленты - один проход по диапазону этого индекса
+Index(
+    "ix_home_timeline_user_id_time_created_post_id",
+    home_timeline_table.c.user_id,
+    home_timeline_table.c.time_created.desc(),
+    home_timeline_table.c.post_id.desc(),
 )
 
 
@@ -35,3 +79,35 @@ class Post(Base):
     text = Column(Text, nullable=False)
     time_created = Column(DateTime(timezone=True), default=func.now())
     time_updated = Column(DateTime(timezone=True), onupdate=func.now())
+    like_count = Column(Integer, nullable=False, default=0, server_default="0")
+    dislike_count = Column(Integer, nullable=False, default=0, server_default="0")
+    #  поисковый вектор: заголовок весит больше текста, индексируется только
+    #  начало длинного текста; колонка не загружается вместе с постом
+    search_vector = deferred(
+        Column(
+            TSVECTOR,
+            Computed(
+                "setweight(to_tsvector('{config}', coalesce(title, '')), 'A') || "
+                "setweight(to_tsvector('{config}', left(text, {length})), 'B')".format(
+                    config=settings.POST_SEARCH_CONFIG,
+                    length=settings.POST_SEARCH_MAX_TEXT_LENGTH,
+                ),
+                persisted=True,
+            ),
+        )
+    )
+
+
+#  индекс для keyset-пагинации ленты по (time_created, id)
+Index("ix_posts_time_created_id", Post.time_created.desc(), Post.id.desc())
+
+#  индекс для выборки постов автора от новых к старым
+Index(
+    "ix_posts_user_id_time_created_id",
+    Post.user_id,
+    Post.time_created.desc(),
+    Post.id.desc(),
+)
+
+#  полнотекстовый поиск по постам
+Index("ix_posts_search_vector", Post.search_vector, postgresql_using="gin")
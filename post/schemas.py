@@ -1,8 +1,9 @@
 import datetime
 import uuid
 
+import orjson
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel
 from pydantic import constr
 
@@ -12,17 +13,81 @@ class TunedModel(BaseModel):
         """tells pydantic to convert even non dict obj to json"""
 
         orm_mode = True
+        json_loads = orjson.loads
+        json_dumps = lambda value, *, default: orjson.dumps(value, default=default).decode()
 
 
 class ShowPost(TunedModel):
     """Модель отображения поста"""
 
     id: uuid.UUID
-    user_id: int
+    user_id: uuid.UUID
     title: str
     text: str
     time_created: datetime.datetime
     time_updated: Optional[datetime.datetime]
+    like_count: int = 0
+    dislike_count: int = 0
+
+
+class PostFeed(BaseModel):
+    """Модель страницы ленты постов"""
+
+    posts: List[ShowPost]
+    next_cursor: Optional[str]
+
+
+class PostSearchHit(ShowPost):
+    """Модель найденного поста с релевантностью и фрагментом текста"""
+
+    rank: float
+    headline: str
+
+
+class PostSearchPage(BaseModel):
+    """Модель страницы результатов поиска постов"""
+
+    posts: List[PostSearchHit]
+    next_cursor: Optional[str]
+
+
+class PostBatch(BaseModel):
+    """Модель пачки постов, полученных по списку id"""
+
+    posts: List[ShowPost]
+    missing: List[uuid.UUID]
+
+
+class PostReactionState(BaseModel):
+    """Реакция текущего пользователя на пост"""
+
+    post_id: uuid.UUID
+    liked: bool
+    disliked: bool
+
+
+class ViewerReactions(BaseModel):
+    """Реакции текущего пользователя на посты из запроса"""
+
+    reactions: List[PostReactionState]
+
+
+class TrendingPost(BaseModel):
+    """Модель поста в трендах"""
+
+    id: uuid.UUID
+    user_id: uuid.UUID
+    title: Optional[str]
+    time_created: datetime.datetime
+    like_count: int
+    dislike_count: int
+    score: float
+
+
+class TrendingPage(BaseModel):
+    """Модель списка постов в трендах"""
+
+    posts: List[TrendingPost]
 
 
 class PostCreate(BaseModel):
@@ -1,8 +1,30 @@
-from typing import Union
+import asyncio
+import datetime
+from typing import AsyncIterator, Dict, List, Optional, Set, Union
 from uuid import UUID
 
+import settings
+from etag import make_etag
+from responses import dumps
+from session import async_session, is_replica_session
+from singleflight import SingleFlight
+
+from .cache import post_cache
+from .counters import reaction_counters
+from .cursor import decode_feed_cursor, decode_search_cursor, encode_cursor
 from .dals import PostDAL
-from .schemas import PostCreate, ShowPost
+from .ingestion import ReactionEvent, reaction_ingestor
+from .schemas import (
+    PostBatch,
+    PostCreate,
+    PostFeed,
+    PostSearchHit,
+    PostReactionState,
+    PostSearchPage,
+    ShowPost,
+    ViewerReactions,
+)
+from .trending import trending_posts
 
 
 #  создание поста
@@ -12,6 +34,10 @@ async def _create_new_post(body: PostCreate, user_id: UUID, session) -> ShowPost
         post = await post_dal.create_post(
             user_id=user_id, title=body.title, text=body.text
         )
+        #  рассылка поста в домашние ленты подписчиков
+        await post_dal.push_post_to_timelines(
+            post_id=post.id, max_followers=settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+        )
         return ShowPost(
             id=post.id,
             user_id=post.user_id,
@@ -19,6 +45,8 @@ async def _create_new_post(body: PostCreate, user_id: UUID, session) -> ShowPost
             text=post.text,
             time_created=post.time_created,
             time_updated=post.time_updated,
+            like_count=post.like_count,
+            dislike_count=post.dislike_count,
         )
 
 
@@ -29,7 +57,9 @@ async def _delete_post(post_id: UUID, author_id: UUID, session) -> Union[UUID, N
         deleted_post_id = await post_dal.delete_post(
             post_id=post_id, author_id=author_id
         )
-        return deleted_post_id
+    if post_cache is not None:
+        await post_cache.invalidate([post_id])
+    return deleted_post_id
 
 
 #  обновление поста
@@ -41,11 +71,13 @@ async def _update_post(
         updated_post_id = await post_dal.update_post(
             post_id=post_id, author_id=author_id, **updated_post_params
         )
-        return updated_post_id
+    if post_cache is not None:
+        await post_cache.invalidate([post_id])
+    return updated_post_id
 
 
-#  получение поста
-async def _get_post_by_id(post_id, session) -> Union[ShowPost, None]:
+#  загрузка поста из базы
+async def _load_post(post_id: UUID, session) -> Union[ShowPost, None]:
     async with session.begin():
         post_dal = PostDAL(session)
         post = await post_dal.get_post_by_id(
@@ -59,15 +91,266 @@ async def _get_post_by_id(post_id, session) -> Union[ShowPost, None]:
                 text=post.text,
                 time_created=post.time_created,
                 time_updated=post.time_updated,
+                like_count=post.like_count,
+                dislike_count=post.dislike_count,
             )
 
 
+#  чтение поста через кэш, если он включён. Кэш заполняется только чтениями
+#  с основной базы: пост, прочитанный с отстающей реплики после изменения,
+#  иначе лёг бы под новую версию и отдавался бы всем до истечения TTL
+async def _read_post(post_id: UUID, session) -> Union[ShowPost, None]:
+    if post_cache is None:
+        return await _load_post(post_id, session)
+    if is_replica_session(session):
+        cached, post = await post_cache.get(post_id)
+        return post if cached else await _load_post(post_id, session)
+    return await post_cache.get_or_load(
+        post_id, lambda: _load_post(post_id, session)
+    )
+
+
+#  ETag поста: id, время изменения и счётчики реакций, которые тоже входят в ответ
+def _post_etag(
+    post_id: UUID,
+    time_updated: Optional[datetime.datetime],
+    like_count: int,
+    dislike_count: int,
+) -> str:
+    updated = time_updated.timestamp() if time_updated is not None else None
+    return make_etag("post", post_id, updated, like_count, dislike_count)
+
+
+#  ETag отображаемого поста
+def _show_post_etag(post: ShowPost) -> str:
+    return _post_etag(post.id, post.time_updated, post.like_count, post.dislike_count)
+
+
+#  получение ETag поста из кэша или лёгким запросом без загрузки текста
+async def _get_post_etag(post_id: UUID, session) -> Union[str, None]:
+    if post_cache is not None:
+        cached, post = await post_cache.get(post_id)
+        if cached:
+            return _show_post_etag(post) if post is not None else None
+    async with session.begin():
+        post_dal = PostDAL(session)
+        version = await post_dal.get_post_version(post_id=post_id)
+    if version is not None:
+        return _post_etag(post_id, *version)
+
+
+#  одновременные запросы одного поста выполняются одним чтением
+post_lookups = SingleFlight("post_by_id")
+
+
+#  получение поста; чтения с реплики и с основной базы не объединяются, чтобы
+#  клиент, читающий свои записи с основной базы, не получил ответ реплики
+async def _get_post_by_id(post_id, session) -> Union[ShowPost, None]:
+    return await post_lookups.do(
+        (post_id, is_replica_session(session)), lambda: _read_post(post_id, session)
+    )
+
+
+class PostLoader:
+    """Request-scoped batcher that resolves lookups of one loop tick with one query"""
+
+    def __init__(self, session):
+        self.session = session
+        self._pending: Dict[UUID, asyncio.Future] = {}
+        #  сессия не допускает параллельных запросов, пачки выполняются по очереди
+        self._dispatch_lock = asyncio.Lock()
+        #  ссылки на запущенные пачки, чтобы их задачи не собрал сборщик мусора
+        self._dispatch_tasks: Set[asyncio.Task] = set()
+
+    #  запрос поста; запросы одного тика цикла событий объединяются в один SELECT
+    def load(self, post_id: UUID) -> "asyncio.Future[Optional[ShowPost]]":
+        future = self._pending.get(post_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            if not self._pending:
+                loop.call_soon(self._start_dispatch)
+            future = loop.create_future()
+            self._pending[post_id] = future
+        return future
+
+    def _start_dispatch(self) -> None:
+        task = asyncio.create_task(self._dispatch())
+        self._dispatch_tasks.add(task)
+        task.add_done_callback(self._dispatch_tasks.discard)
+
+    async def _dispatch(self) -> None:
+        pending, self._pending = self._pending, {}
+        try:
+            async with self._dispatch_lock:
+                async with self.session.begin():
+                    post_dal = PostDAL(self.session)
+                    posts = await post_dal.get_posts_by_ids(post_ids=list(pending))
+        except Exception as err:
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(err)
+            return
+        found = {post.id: ShowPost.from_orm(post) for post in posts}
+        for post_id, future in pending.items():
+            if not future.done():
+                future.set_result(found.get(post_id))
+
+
+#  получение постов по списку id в порядке запроса
+async def _get_posts_batch(post_ids: List[UUID], session) -> PostBatch:
+    loader = PostLoader(session)
+    unique_ids = list(dict.fromkeys(post_ids))
+    posts = await asyncio.gather(*(loader.load(post_id) for post_id in unique_ids))
+    return PostBatch(
+        posts=[post for post in posts if post is not None],
+        missing=[
+            post_id for post_id, post in zip(unique_ids, posts) if post is None
+        ],
+    )
+
+
+#  реакции пользователя на посты в порядке запроса
+async def _get_viewer_reactions(
+    post_ids: List[UUID], user_id: UUID, session
+) -> ViewerReactions:
+    unique_ids = list(dict.fromkeys(post_ids))
+    async with session.begin():
+        post_dal = PostDAL(session)
+        reactions = set(await post_dal.get_viewer_reactions(user_id, unique_ids))
+    return ViewerReactions(
+        reactions=[
+            PostReactionState(
+                post_id=post_id,
+                liked=(post_id, "like") in reactions,
+                disliked=(post_id, "dislike") in reactions,
+            )
+            for post_id in unique_ids
+        ]
+    )
+
+
+#  получение страницы ленты постов
+async def _get_feed(limit: int, cursor: Optional[str], session) -> PostFeed:
+    after_time_created, after_id = (
+        decode_feed_cursor(cursor) if cursor is not None else (None, None)
+    )
+    async with session.begin():
+        post_dal = PostDAL(session)
+        #  запрашивается на один пост больше, чтобы понять есть ли следующая страница
+        posts = await post_dal.get_feed(
+            limit=limit + 1,
+            after_time_created=after_time_created,
+            after_id=after_id,
+        )
+    next_cursor = None
+    if len(posts) > limit:
+        posts = posts[:limit]
+        next_cursor = encode_cursor(posts[-1].time_created, posts[-1].id)
+    return PostFeed(
+        posts=[ShowPost.from_orm(post) for post in posts], next_cursor=next_cursor
+    )
+
+
+#  получение страницы домашней ленты пользователя
+async def _get_home_timeline(
+    user_id: UUID, limit: int, cursor: Optional[str], session
+) -> PostFeed:
+    after_time_created, after_id = (
+        decode_feed_cursor(cursor) if cursor is not None else (None, None)
+    )
+    async with session.begin():
+        post_dal = PostDAL(session)
+        posts = await post_dal.get_home_timeline(
+            user_id=user_id,
+            limit=limit + 1,
+            max_followers=settings.TIMELINE_FANOUT_MAX_FOLLOWERS,
+            after_time_created=after_time_created,
+            after_id=after_id,
+        )
+    next_cursor = None
+    if len(posts) > limit:
+        posts = posts[:limit]
+        next_cursor = encode_cursor(posts[-1].time_created, posts[-1].id)
+    return PostFeed(
+        posts=[ShowPost.from_orm(post) for post in posts], next_cursor=next_cursor
+    )
+
+
+#  поиск постов по тексту с сортировкой по релевантности
+async def _search_posts(
+    query: str, limit: int, cursor: Optional[str], session
+) -> PostSearchPage:
+    after_rank, after_id = (
+        decode_search_cursor(cursor) if cursor is not None else (None, None)
+    )
+    async with session.begin():
+        post_dal = PostDAL(session)
+        #  запрашивается на один пост больше, чтобы понять есть ли следующая страница
+        hits = await post_dal.search_posts(
+            query=query, limit=limit + 1, after_rank=after_rank, after_id=after_id
+        )
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        last_post, last_rank, _ = hits[-1]
+        next_cursor = encode_cursor(last_rank, last_post.id)
+    return PostSearchPage(
+        posts=[
+            PostSearchHit(
+                **ShowPost.from_orm(post).dict(), rank=rank, headline=headline
+            )
+            for post, rank, headline in hits
+        ],
+        next_cursor=next_cursor,
+    )
+
+
+#  выгрузка всех постов автора в NDJSON. Каждое окно постов читается
+#  отдельной короткой транзакцией и отдаётся клиенту уже после её завершения,
+#  поэтому медленный клиент не держит транзакцию и соединение, а память
+#  ограничена размером окна
+async def _export_user_posts(user_id: UUID) -> AsyncIterator[bytes]:
+    after_time_created, after_id = None, None
+    while True:
+        chunks = []
+        rows = 0
+        async with async_session() as session:
+            async with session.begin():
+                #  курсор на сервере работает только внутри транзакции
+                await session.connection(
+                    execution_options={"isolation_level": "READ COMMITTED"}
+                )
+                result = await PostDAL(session).stream_user_posts(
+                    user_id=user_id,
+                    limit=settings.POST_EXPORT_WINDOW_SIZE,
+                    chunk_size=settings.POST_EXPORT_CHUNK_SIZE,
+                    after_time_created=after_time_created,
+                    after_id=after_id,
+                )
+                async for partition in result.mappings().partitions(
+                    settings.POST_EXPORT_CHUNK_SIZE
+                ):
+                    chunks.append(
+                        b"".join(dumps(dict(row)) + b"\n" for row in partition)
+                    )
+                    rows += len(partition)
+                    last = partition[-1]
+        for chunk in chunks:
+            yield chunk
+        if rows < settings.POST_EXPORT_WINDOW_SIZE:
+            return
+        after_time_created, after_id = last["time_created"], last["id"]
+
+
 # лайк посту
 async def _like_post(post_id: UUID, user_id: int, session) -> bool:
     async with session.begin():
         post_dal = PostDAL(session)
         post = await post_dal.add_like_to_post(post_id=post_id, user_id=user_id)
-        return post
+    if post:
+        reaction_counters.add(post_id, likes=1)
+        trending_posts.record_reaction(post_id, likes=1)
+    return post
 
 
 # убрать лайк посту
@@ -75,7 +358,10 @@ async def _remove_like_post(post_id: UUID, user_id: int, session) -> bool:
     async with session.begin():
         post_dal = PostDAL(session)
         post = await post_dal.remove_like_from_post(post_id=post_id, user_id=user_id)
-        return post
+    if post:
+        reaction_counters.add(post_id, likes=-1)
+        trending_posts.record_reaction(post_id, likes=-1)
+    return post
 
 
 # дизлайк посту
@@ -83,7 +369,10 @@ async def _dislike_post(post_id: UUID, user_id: int, session) -> bool:
     async with session.begin():
         post_dal = PostDAL(session)
         post = await post_dal.add_dislike_to_post(post_id=post_id, user_id=user_id)
-        return post
+    if post:
+        reaction_counters.add(post_id, dislikes=1)
+        trending_posts.record_reaction(post_id, dislikes=1)
+    return post
 
 
 # убрать дизлайк посту
@@ -91,4 +380,15 @@ async def _remove_dislike_post(post_id: UUID, user_id: int, session) -> bool:
     async with session.begin():
         post_dal = PostDAL(session)
         post = await post_dal.remove_dislike_from_post(post_id=post_id, user_id=user_id)
-        return post
+    if post:
+        reaction_counters.add(post_id, dislikes=-1)
+        trending_posts.record_reaction(post_id, dislikes=-1)
+    return post
+
+
+#  постановка реакции в очередь пакетной записи
+def _enqueue_reaction(kind: str, post_id: UUID, user_id: UUID, added: bool) -> bool:
+    reaction_ingestor.submit(
+        ReactionEvent(kind=kind, post_id=post_id, user_id=user_id, added=added)
+    )
+    return True
@@ -0,0 +1,75 @@
+import asyncio
+from logging import getLogger
+from typing import Optional
+from uuid import UUID
+
+import settings
+from session import async_session
+
+from .dals import PostDAL
+
+logger = getLogger(__name__)
+#  начало обхода: все id пользователей (uuid4) больше нулевого UUID
+FIRST_USER_ID = UUID(int=0)
+
+
+class TimelineTrimmer:
+    """Periodically trims precomputed home timelines to a bounded length.
+
+    Users are walked in ``user_id`` order, ``batch_users`` per short
+    transaction, so a run never scans or locks the whole timeline table.
+    """
+
+    def __init__(self, interval: float, max_length: int, batch_users: int):
+        self.interval = interval
+        self.max_length = max_length
+        self.batch_users = batch_users
+        self._task: Optional[asyncio.Task] = None
+
+    #  одна обрезка всех лент, пачками пользователей
+    async def trim(self) -> int:
+        removed = 0
+        after_user_id = FIRST_USER_ID
+        while True:
+            async with async_session() as session:
+                async with session.begin():
+                    post_dal = PostDAL(session)
+                    user_ids = await post_dal.get_timeline_users(
+                        after_user_id, self.batch_users
+                    )
+                    if user_ids:
+                        removed += await post_dal.trim_timelines(
+                            user_ids, self.max_length
+                        )
+            if len(user_ids) < self.batch_users:
+                return removed
+            after_user_id = user_ids[-1]
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                removed = await self.trim()
+                logger.info("Trimmed %s timeline entries", removed)
+            except Exception as err:
+                logger.error(err)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+timeline_trimmer = TimelineTrimmer(
+    interval=settings.TIMELINE_TRIM_INTERVAL_SECONDS,
+    max_length=settings.TIMELINE_MAX_LENGTH,
+    batch_users=settings.TIMELINE_TRIM_BATCH_USERS,
+)
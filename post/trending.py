@@ -0,0 +1,149 @@
+import asyncio
+import datetime
+import heapq
+import math
+from logging import getLogger
+from operator import attrgetter
+from typing import Dict, List, Optional
+from uuid import UUID
+
+import settings
+from responses import dumps
+from session import async_session
+
+from .dals import PostDAL
+from .schemas import TrendingPage, TrendingPost
+
+logger = getLogger(__name__)
+
+
+#  hot score: порядок разницы лайков и дизлайков плюс время создания.
+#  Оценка не меняется со временем, а более новые посты получают больше,
+#  поэтому порядок постов можно поддерживать без пересчёта по часам
+def hot_score(
+    likes: int, dislikes: int, time_created: datetime.datetime, decay_seconds: float
+) -> float:
+    net = likes - dislikes
+    sign = (net > 0) - (net < 0)
+    return sign * math.log10(max(abs(net), 1)) + time_created.timestamp() / decay_seconds
+
+
+class TrendingPosts:
+    """Hot scores of recent posts kept in memory, with the top of them ready to serve.
+
+    Candidates are reloaded from the database every ``interval`` seconds and
+    updated in between as reactions arrive; posts that are not candidates yet
+    can only enter with the next reload.
+    """
+
+    def __init__(
+        self,
+        top_size: int,
+        max_candidates: int,
+        window_seconds: int,
+        decay_seconds: float,
+        interval: float,
+    ):
+        self.top_size = top_size
+        self.max_candidates = max_candidates
+        self.window_seconds = window_seconds
+        self.decay_seconds = decay_seconds
+        self.interval = interval
+        self._candidates: Dict[UUID, TrendingPost] = {}
+        #  топ и готовые ответы пересобираются только после изменений
+        self._top: Optional[List[TrendingPost]] = None
+        self._rendered: Dict[int, bytes] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _changed(self) -> None:
+        self._top = None
+        self._rendered.clear()
+
+    #  учёт новой или снятой реакции на пост
+    def record_reaction(self, post_id: UUID, likes: int = 0, dislikes: int = 0) -> None:
+        post = self._candidates.get(post_id)
+        if post is None:
+            return
+        post.like_count += likes
+        post.dislike_count += dislikes
+        post.score = hot_score(
+            post.like_count, post.dislike_count, post.time_created, self.decay_seconds
+        )
+        self._changed()
+
+    #  лучшие посты; в тренды попадают только посты с перевесом лайков
+    def top(self, limit: int) -> List[TrendingPost]:
+        if self._top is None:
+            self._top = heapq.nlargest(
+                self.top_size,
+                (
+                    post
+                    for post in self._candidates.values()
+                    if post.like_count > post.dislike_count
+                ),
+                key=attrgetter("score"),
+            )
+        return self._top[:limit]
+
+    #  готовый JSON ответа, чтобы не кодировать топ на каждый запрос
+    def render(self, limit: int) -> bytes:
+        body = self._rendered.get(limit)
+        if body is None:
+            body = dumps(TrendingPage(posts=self.top(limit)))
+            self._rendered[limit] = body
+        return body
+
+    #  перезагрузка кандидатов из базы
+    async def reconcile(self) -> int:
+        since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+            seconds=self.window_seconds
+        )
+        async with async_session() as session:
+            async with session.begin():
+                rows = await PostDAL(session).get_trending_candidates(
+                    since=since, decay_seconds=self.decay_seconds, limit=self.max_candidates
+                )
+        self._candidates = {
+            post_id: TrendingPost(
+                id=post_id,
+                user_id=user_id,
+                title=title,
+                time_created=time_created,
+                like_count=like_count,
+                dislike_count=dislike_count,
+                score=hot_score(like_count, dislike_count, time_created, self.decay_seconds),
+            )
+            for post_id, user_id, title, time_created, like_count, dislike_count in rows
+        }
+        self._changed()
+        return len(self._candidates)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.reconcile()
+            except Exception as err:
+                logger.error(err)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+trending_posts = TrendingPosts(
+    top_size=settings.TRENDING_TOP_SIZE,
+    max_candidates=settings.TRENDING_MAX_CANDIDATES,
+    window_seconds=settings.TRENDING_WINDOW_SECONDS,
+    decay_seconds=settings.TRENDING_DECAY_SECONDS,
+    interval=settings.TRENDING_RECONCILE_INTERVAL_SECONDS,
+)
@@ -0,0 +1,29 @@
+"""Statements compiled once at import time"""
+from typing import Union
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.postgresql.base import PGDialect
+from sqlalchemy.engine.interfaces import BindTyping
+from sqlalchemy.sql.elements import TextClause
+from sqlalchemy.sql.selectable import TextualSelect
+
+#  SQL для text() собирается с именованными параметрами (:name) и без приведений
+#  типов: их при выполнении добавит диалект asyncpg по типам bindparam
+_dialect = PGDialect(paramstyle="named")
+_dialect.bind_typing = BindTyping.NONE
+
+
+#  INSERT из диалекта postgresql (ON CONFLICT) в SQLAlchemy 2.0 не кэшируется
+#  и компилируется заново при каждом выполнении; его SQL компилируется один раз
+#  и выполняется как text() с теми же типами параметров и колонок RETURNING.
+#  С RETURNING такой text() становится TextualSelect и выглядит как SELECT,
+#  поэтому запись помечается опцией выполнения is_dml
+def precompile(statement) -> Union[TextClause, TextualSelect]:
+    compiled = statement.compile(dialect=_dialect)
+    query = text(str(compiled)).bindparams(
+        *(bindparam(name, type_=bind.type) for name, bind in compiled.binds.items())
+    )
+    returning = list(statement.exported_columns)
+    if returning:
+        query = query.columns(*returning)
+    return query.execution_options(is_dml=statement.is_dml)
@@ -0,0 +1,124 @@
+"""Routing of read-only sessions to database replicas"""
+import itertools
+import logging
+import time
+from typing import Dict, List, Optional, Union
+
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+ROUND_ROBIN = "round_robin"
+LEAST_CONNECTIONS = "least_connections"
+#  клиенты, недавно писавшие в базу, которых помнит роутер
+STICKY_CLIENTS_MAX_SIZE = 100000
+
+
+class Replica:
+    """Replica engine and the time until which it is skipped after a failure"""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.unhealthy_until = 0.0
+        self.failures = 0
+        #  после сбоя реплика снова получает чтения только после пробного подключения
+        self.needs_probe = False
+
+    def is_healthy(self, now: float) -> bool:
+        return self.unhealthy_until <= now
+
+
+class ReplicaRouter:
+    """Picks the replica for read-only sessions.
+
+    Returns ``None`` (use the primary) when there are no healthy replicas or
+    when the client wrote to the primary within the read-your-writes window.
+    """
+
+    def __init__(
+        self,
+        engines: List[AsyncEngine],
+        strategy: str,
+        retry_seconds: float,
+        sticky_seconds: float,
+    ):
+        if strategy not in (ROUND_ROBIN, LEAST_CONNECTIONS):
+            raise ValueError(f"Unknown replica selection strategy: {strategy}")
+        self.replicas = [Replica(engine) for engine in engines]
+        self.strategy = strategy
+        self.retry_seconds = retry_seconds
+        self.sticky_seconds = sticky_seconds
+        self._sticky_clients = TTLCache(
+            max_size=STICKY_CLIENTS_MAX_SIZE, ttl=sticky_seconds, name="sticky_clients"
+        )
+        self._turn = itertools.count()
+        for replica in self.replicas:
+            self._watch_errors(replica)
+
+    #  реплика, на которой оборвалось соединение или не удалось подключиться,
+    #  пропускается retry_seconds
+    def _watch_errors(self, replica: Replica) -> None:
+        @event.listens_for(replica.engine.sync_engine, "handle_error")
+        def handle_error(context):
+            if context.is_disconnect or context.connection is None:
+                self.mark_unhealthy(replica)
+
+    def mark_unhealthy(self, replica: Replica) -> None:
+        replica.failures += 1
+        replica.unhealthy_until = time.monotonic() + self.retry_seconds
+        replica.needs_probe = True
+        logger.warning(
+            "Replica %s marked unhealthy for %.0f s",
+            replica.engine.url.render_as_string(hide_password=True),
+            self.retry_seconds,
+        )
+
+    #  клиент, записавший в базу, читает с основной базы sticky_seconds
+    def mark_write(self, client_key: Optional[str]) -> None:
+        if client_key is not None and self.replicas and self.sticky_seconds > 0:
+            self._sticky_clients.set(client_key, True)
+
+    #  пробное подключение к реплике после сбоя
+    async def _probe(self, replica: Replica) -> bool:
+        try:
+            async with replica.engine.connect():
+                pass
+        except (OSError, DBAPIError):
+            self.mark_unhealthy(replica)
+            return False
+        replica.needs_probe = False
+        return True
+
+    #  выбор реплики для чтения; None - читать с основной базы
+    async def choose(self, client_key: Optional[str] = None) -> Optional[Replica]:
+        if not self.replicas:
+            return None
+        if client_key is not None and self._sticky_clients.get(client_key):
+            return None
+        now = time.monotonic()
+        healthy = [replica for replica in self.replicas if replica.is_healthy(now)]
+        if not healthy:
+            return None
+        if self.strategy == LEAST_CONNECTIONS:
+            replica = min(healthy, key=lambda replica: replica.engine.pool.checkedout())
+        else:
+            replica = healthy[next(self._turn) % len(healthy)]
+        if replica.needs_probe and not await self._probe(replica):
+            return None
+        return replica
+
+    def stats(self) -> List[Dict[str, Union[str, bool, int]]]:
+        now = time.monotonic()
+        return [
+            {
+                "url": replica.engine.url.render_as_string(hide_password=True),
+                "healthy": replica.is_healthy(now),
+                "failures": replica.failures,
+                "checked_out": replica.engine.pool.checkedout(),
+            }
+            for replica in self.replicas
+        ]
@@ -0,0 +1,34 @@
+"""Fast JSON responses rendered with orjson"""
+from typing import Any
+from uuid import UUID
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+#  модели pydantic отдаются в orjson словарём; подклассы UUID (например, UUID
+#  из asyncpg) orjson сам не кодирует
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+    if isinstance(obj, UUID):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+#  кодирование ответа в JSON; используется и для заранее собранных ответов
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ModelResponse(JSONResponse):
+    """JSON response rendered with orjson.
+
+    Routes return it with a model that a service has already validated, so
+    FastAPI skips validating the model against ``response_model`` a second
+    time; ``response_model`` is then used only for the OpenAPI schema.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,27 +1,140 @@
 from typing import AsyncGenerator
+from typing import Optional
 
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import Session
 from sqlalchemy.orm import sessionmaker
 
 import settings
+from db_pool import InstrumentedAsyncPool
+from metrics import instrument_engine
+from replicas import ReplicaRouter
+
+#  pgbouncer в режиме транзакций не сохраняет подготовленные запросы между
+#  транзакциями, поэтому кэши запросов asyncpg и SQLAlchemy отключаются
+statement_cache_size = 0 if settings.DB_PGBOUNCER else settings.DB_STATEMENT_CACHE_SIZE
+
+
+#  создание движка с настройками пула из settings
+def _create_engine(url: str):
+    return create_async_engine(
+        url,
+        future=True,
+        echo=settings.DB_ECHO,
+        execution_options={"isolation_level": "AUTOCOMMIT"},
+        poolclass=InstrumentedAsyncPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={
+            "statement_cache_size": statement_cache_size,
+            "prepared_statement_cache_size": statement_cache_size,
+        },
+    )
+
 
 # create async engine for interaction with database
-engine = create_async_engine(
-    settings.REAL_DATABASE_URL,
-    future=True,
-    echo=True,
-    execution_options={"isolation_level": "AUTOCOMMIT"},
+engine = _create_engine(settings.REAL_DATABASE_URL)
+
+# create engines for the read replicas and the router that picks one for reads
+replica_router = ReplicaRouter(
+    [_create_engine(url) for url in settings.DATABASE_REPLICA_URLS],
+    strategy=settings.DB_REPLICA_STRATEGY,
+    retry_seconds=settings.DB_REPLICA_RETRY_SECONDS,
+    sticky_seconds=settings.DB_READ_YOUR_WRITES_SECONDS,
 )
 
+#  время и число запросов к каждой базе для /metrics
+if settings.METRICS_ENABLED:
+    instrument_engine(engine, "primary")
+    for index, replica in enumerate(replica_router.replicas):
+        instrument_engine(replica.engine, f"replica{index}")
+
+
+class WriteTrackingSession(Session):
+    """Session that makes its client read from the primary after a write"""
+
+
+#  любой запрос, кроме SELECT, считается записью; заранее собранные
+#  INSERT ... RETURNING выглядят как SELECT и отмечены опцией is_dml
+@event.listens_for(WriteTrackingSession, "do_orm_execute")
+def _track_write_statement(orm_execute_state) -> None:
+    execution_options = orm_execute_state.execution_options
+    if not orm_execute_state.is_select or execution_options.get("is_dml", False):
+        replica_router.mark_write(orm_execute_state.session.info.get("client_key"))
+
+
+@event.listens_for(WriteTrackingSession, "after_flush")
+def _track_flush(session, flush_context) -> None:
+    replica_router.mark_write(session.info.get("client_key"))
+
+
 # create session for the interaction with database
-async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+async_session = sessionmaker(
+    engine,
+    expire_on_commit=False,
+    class_=AsyncSession,
+    sync_session_class=WriteTrackingSession,
+)
+
+
+#  сессия читает с реплики, а не с основной базы
+def is_replica_session(session: AsyncSession) -> bool:
+    return session.bind is not engine
+
+
+#  клиент для read-your-writes определяется по токену авторизации
+def _client_key(request: Request) -> Optional[str]:
+    return request.headers.get("authorization")
 
 
-async def get_db() -> AsyncGenerator:
+async def get_db(request: Request) -> AsyncGenerator:
     """Dependency for getting async session"""
     try:
-        session: AsyncSession = async_session()
+        session: AsyncSession = async_session(
+            info={"client_key": _client_key(request)}
+        )
+        yield session
+    finally:
+        await session.close()
+
+
+async def get_read_db(request: Request) -> AsyncGenerator:
+    """Dependency for getting async session for reads, bound to a replica if one is available"""
+    client_key = _client_key(request)
+    replica = await replica_router.choose(client_key)
+    connection: Optional[AsyncConnection] = None
+    if replica is not None:
+        #  соединение с репликой берётся до запроса: если реплика недоступна,
+        #  запрос читает с основной базы
+        try:
+            connection = await replica.engine.connect()
+        except DBAPIError:
+            #  реплику уже отметил обработчик handle_error роутера
+            pass
+        except OSError:
+            #  asyncpg отдаёт ошибки подключения без обёртки DBAPIError, поэтому
+            #  handle_error их не видит
+            replica_router.mark_unhealthy(replica)
+    try:
+        if connection is None:
+            session: AsyncSession = async_session(info={"client_key": client_key})
+        else:
+            session = async_session(bind=connection, info={"client_key": client_key})
         yield session
+    except OSError:
+        #  соединение с репликой оборвалось во время запроса
+        if connection is not None:
+            replica_router.mark_unhealthy(replica)
+        raise
     finally:
-        await session.close()
\ No newline at end of file
+        await session.close()
+        if connection is not None:
+            await connection.close()
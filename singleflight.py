@@ -0,0 +1,56 @@
+"""Coalescing of concurrent identical lookups"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+#  все созданные группы, для вывода счётчиков
+single_flight_groups: List["SingleFlight"] = []
+
+
+class SingleFlight:
+    """Shares one in-flight call and its result between concurrent callers of a key"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        single_flight_groups.append(self)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+        }
+
+    #  выполнение fn для ключа; одновременные вызовы с тем же ключом ждут первый
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        while key in self._in_flight:
+            in_flight = self._in_flight[key]
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                #  отменён первый вызов, а не ожидающий: вызов повторяется
+                if not in_flight.cancelled():
+                    raise
+
+        in_flight = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = in_flight
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            in_flight.cancel()
+            raise
+        except Exception as err:
+            in_flight.set_exception(err)
+            #  ошибка передаётся ожидающим, а не в лог необработанных исключений
+            in_flight.exception()
+            raise
+        else:
+            in_flight.set_result(result)
+            return result
+        finally:
+            del self._in_flight[key]
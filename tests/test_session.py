@@ -0,0 +1,49 @@
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import UnboundExecutionError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import session
+from replicas import ReplicaRouter
+from session import WriteTrackingSession
+from user.dals import insert_follow
+from user.models import User
+
+CLIENT_KEY = "Bearer token"
+
+
+@pytest.fixture
+def router(monkeypatch):
+    #  движок реплики создаётся без подключения: выбор реплики его не открывает
+    router = ReplicaRouter(
+        [create_async_engine("postgresql+asyncpg://replica/postgres")],
+        strategy="round_robin",
+        retry_seconds=1,
+        sticky_seconds=60,
+    )
+    monkeypatch.setattr(session, "replica_router", router)
+    return router
+
+
+#  запрос выполняется в сессии без базы: событие do_orm_execute срабатывает
+#  до выбора соединения, после него выполнение обрывается
+def _execute(statement, params=None):
+    with WriteTrackingSession(info={"client_key": CLIENT_KEY}) as db_session:
+        with pytest.raises(UnboundExecutionError):
+            db_session.execute(statement, params)
+
+
+def test_precompiled_insert_marks_client_sticky(router):
+    _execute(
+        insert_follow,
+        {"b_follower_id": uuid.uuid4(), "b_followee_id": uuid.uuid4()},
+    )
+    assert asyncio.run(router.choose(CLIENT_KEY)) is None
+
+
+def test_select_keeps_client_on_replica(router):
+    _execute(select(User))
+    assert asyncio.run(router.choose(CLIENT_KEY)) is router.replicas[0]
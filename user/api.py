@@ -1,39 +1,89 @@
 from logging import getLogger
+from typing import Optional
 from uuid import UUID
 
 from fastapi import APIRouter
 from fastapi import Depends
+from fastapi import Header
 from fastapi import HTTPException
+from fastapi import Request
+from fastapi import Response
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .services import get_current_user_from_token
+from .services import _bulk_create_users
 from .services import _create_new_user
 from .services import _delete_user
+from .services import _follow_user
 from .services import _get_user_by_id
+from .services import _get_user_etag
+from .services import _user_etag
+from .services import _unfollow_user
 from .services import _update_user
+from .schemas import BulkUserCreateResponse
 from .schemas import DeleteUserResponse
+from .schemas import Principal
 from .schemas import ShowUser
 from .schemas import UpdatedUserResponse
 from .schemas import UpdateUserRequest
 from .schemas import UserCreate
-from .models import User
+import settings
+from admission import AdmissionController, client_user
+from etag import etag_matches
+from responses import ModelResponse
 from session import get_db
+from session import get_read_db
 
 logger = getLogger(__name__)
 
 user_router = APIRouter()
 
+#  ограничение маршрутов, хэширующих пароли: регистрации и массового импорта;
+#  остальные маршруты /user не ждут за ними в очереди
+user_admission = AdmissionController(
+    "user",
+    max_concurrency=settings.USER_MAX_CONCURRENCY,
+    max_queue=settings.USER_MAX_QUEUE,
+    queue_timeout=settings.USER_QUEUE_TIMEOUT_SECONDS,
+    rate=settings.USER_RATE_PER_MINUTE / 60,
+    burst=settings.USER_RATE_BURST,
+    client_key=client_user,
+)
+
 
 #  создание нового пользователя
-@user_router.post("/", response_model=ShowUser)
-async def create_user(body: UserCreate, db: AsyncSession = Depends(get_db)) -> ShowUser:
+@user_router.post(
+    "/", response_model=ShowUser, dependencies=[Depends(user_admission)]
+)
+async def create_user(body: UserCreate, db: AsyncSession = Depends(get_db)) -> ModelResponse:
     try:
         #  вызывается функция создания нового пользователя
-        return await _create_new_user(body, db)
+        user = await _create_new_user(body, db)
+    except IntegrityError as err:
+        logger.error(err)
+        raise HTTPException(status_code=503, detail=f"Database error: {err}")
+    return ModelResponse(user)
+
+
+#  массовое создание пользователей из тела запроса в формате NDJSON
+@user_router.post(
+    "/bulk",
+    response_model=BulkUserCreateResponse,
+    dependencies=[Depends(user_admission)],
+)
+async def bulk_create_users(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user_from_token),
+) -> ModelResponse:
+    try:
+        #  вызывается функция массового создания пользователей
+        result = await _bulk_create_users(request.stream(), db)
     except IntegrityError as err:
         logger.error(err)
         raise HTTPException(status_code=503, detail=f"Database error: {err}")
+    return ModelResponse(result)
 
 
 #  удаление пользователя
@@ -41,31 +91,39 @@ async def create_user(body: UserCreate, db: AsyncSession = Depends(get_db)) -> S
 async def delete_user(
     user_id: UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user_from_token),
-) -> DeleteUserResponse:
+    current_user: Principal = Depends(get_current_user_from_token),
+) -> ModelResponse:
     #  вызывается функция удаления пользователя
     deleted_user_id = await _delete_user(user_id, db)
     if deleted_user_id is None:
         raise HTTPException(
             status_code=404, detail=f"User with id {user_id} not found."
         )
-    return DeleteUserResponse(deleted_user_id=deleted_user_id)
+    return ModelResponse(DeleteUserResponse(deleted_user_id=deleted_user_id))
 
 
 #  получение пользователя по id
 @user_router.get("/", response_model=ShowUser)
 async def get_user_by_id(
     user_id: UUID,
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user_from_token),
-) -> ShowUser:
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user_from_token),
+) -> ModelResponse:
+    #  условный запрос проверяется по версии строки пользователя
+    if if_none_match is not None:
+        etag = await _get_user_etag(user_id, db)
+        if etag is not None and etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
     #  вызывается функция получения пользователя по id
     user = await _get_user_by_id(user_id, db)
     if user is None:
         raise HTTPException(
             status_code=404, detail=f"User with id {user_id} not found."
         )
-    return user
+    return ModelResponse(
+        user, headers={"ETag": _user_etag(user.user_id, user.row_version)}
+    )
 
 
 #  обновление пользователя
@@ -74,8 +132,8 @@ async def update_user_by_id(
     user_id: UUID,
     body: UpdateUserRequest,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user_from_token),
-) -> UpdatedUserResponse:
+    current_user: Principal = Depends(get_current_user_from_token),
+) -> ModelResponse:
     updated_user_params = body.dict(exclude_none=True)
     #  проверка переданы ли какие-то параметры для изменения пользователя
     if updated_user_params == {}:
@@ -97,4 +155,40 @@ async def update_user_by_id(
     except IntegrityError as err:
         logger.error(err)
         raise HTTPException(status_code=503, detail=f"Database error: {err}")
-    return UpdatedUserResponse(updated_user_id=updated_user_id)
+    return ModelResponse(UpdatedUserResponse(updated_user_id=updated_user_id))
+
+
+#  подписка на пользователя
+@user_router.post("/follow")
+async def follow_user(
+    user_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user_from_token),
+) -> bool:
+    if user_id == current_user.user_id:
+        raise HTTPException(status_code=422, detail="Users cannot follow themselves")
+    try:
+        #  вызывается функция подписки на пользователя
+        return await _follow_user(
+            follower_id=current_user.user_id, followee_id=user_id, session=db
+        )
+    except IntegrityError as err:
+        logger.error(err)
+        raise HTTPException(status_code=503, detail=f"Database error: {err}")
+
+
+#  отписка от пользователя
+@user_router.post("/unfollow")
+async def unfollow_user(
+    user_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user_from_token),
+) -> bool:
+    try:
+        #  вызывается функция отписки от пользователя
+        return await _unfollow_user(
+            follower_id=current_user.user_id, followee_id=user_id, session=db
+        )
+    except IntegrityError as err:
+        logger.error(err)
+        raise HTTPException(status_code=503, detail=f"Database error: {err}")
@@ -28,8 +28,12 @@ async def login_for_access_token(
             detail="Incorrect username or password",
         )
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    claims = {"sub": user.email}
+    #  в режиме stateless токена пользователь восстанавливается из токена без запроса в базу
+    if settings.AUTH_STATELESS_TOKENS:
+        claims.update({"user_id": str(user.user_id), "is_active": user.is_active})
     access_token = create_access_token(
-        data={"sub": user.email, "other_custom_data": [1, 2, 3, 4]},
+        data=claims,
         expires_delta=access_token_expires,
     )
     return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
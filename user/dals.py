@@ -1,12 +1,79 @@
-from typing import Union
+import datetime
+from typing import List, Tuple, Union
 from uuid import UUID
 
+from sqlalchemy import Integer
 from sqlalchemy import and_
+from sqlalchemy import bindparam
+from sqlalchemy import delete
+from sqlalchemy import func
 from sqlalchemy import select
 from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import UUID as UUID_TYPE
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .models import User
+from precompiled import precompile
+
+from .models import User, follow_table, user_revocation_table
+
+#  запросы горячих путей собираются один раз при импорте: SQLAlchemy
+#  кэширует их скомпилированный SQL, а asyncpg держит подготовленный запрос
+#  на каждом соединении (DB_STATEMENT_CACHE_SIZE); значения передаются параметрами.
+#  В INSERT/UPDATE имена колонок зарезервированы, поэтому параметры там с префиксом b_
+select_user_by_id = select(User).where(User.user_id == bindparam("user_id"))
+select_user_by_email = select(User).where(User.email == bindparam("email"))
+select_user_version = select(User.row_version).where(
+    User.user_id == bindparam("user_id")
+)
+deactivate_user = (
+    update(User)
+    .where(and_(User.user_id == bindparam("b_user_id"), User.is_active == True))
+    .values(is_active=False, row_version=User.row_version + 1)
+    .returning(User.user_id)
+)
+select_follower_count = select(User.follower_count).where(
+    User.user_id == bindparam("user_id")
+)
+change_follower_count = (
+    update(User)
+    .where(User.user_id == bindparam("b_user_id"))
+    .values(follower_count=User.follower_count + bindparam("delta", type_=Integer))
+)
+#  подписка возможна только на существующего активного пользователя
+insert_follow = precompile(
+    insert(follow_table)
+    .from_select(
+        ["follower_id", "followee_id"],
+        select(
+            bindparam("b_follower_id", type_=UUID_TYPE(as_uuid=True)), User.user_id
+        ).where(and_(User.user_id == bindparam("b_followee_id"), User.is_active == True)),
+    )
+    .on_conflict_do_nothing()
+    .returning(follow_table.c.followee_id)
+)
+delete_follow = (
+    delete(follow_table)
+    .where(
+        and_(
+            follow_table.c.follower_id == bindparam("follower_id"),
+            follow_table.c.followee_id == bindparam("followee_id"),
+        )
+    )
+    .returning(follow_table.c.followee_id)
+)
+upsert_revocation = insert(user_revocation_table).values(
+    user_id=bindparam("b_user_id"), revoked_at=func.now()
+)
+upsert_revocation = precompile(
+    upsert_revocation.on_conflict_do_update(
+        index_elements=[user_revocation_table.c.user_id],
+        set_={"revoked_at": upsert_revocation.excluded.revoked_at},
+    )
+)
+select_revocations_since = select(
+    user_revocation_table.c.user_id, user_revocation_table.c.revoked_at
+).where(user_revocation_table.c.revoked_at > bindparam("since"))
 
 
 class UserDAL:
@@ -28,29 +95,26 @@ class UserDAL:
 
     # Удаление пользователя
     async def delete_user(self, user_id: UUID) -> Union[UUID, None]:
-        query = (
-            update(User)
-            .where(and_(User.user_id == user_id, User.is_active == True))
-            .values(is_active=False)
-            .returning(User.user_id)
-        )
-        res = await self.db_session.execute(query)
+        res = await self.db_session.execute(deactivate_user, {"b_user_id": user_id})
         deleted_user_id_row = res.fetchone()
         if deleted_user_id_row is not None:
             return deleted_user_id_row[0]
 
     # Получение пользователя по id
     async def get_user_by_id(self, user_id: UUID) -> Union[User, None]:
-        query = select(User).where(User.user_id == user_id)
-        res = await self.db_session.execute(query)
+        res = await self.db_session.execute(select_user_by_id, {"user_id": user_id})
         user_row = res.fetchone()
         if user_row is not None:
             return user_row[0]
 
+    # Получение версии строки пользователя
+    async def get_user_version(self, user_id: UUID) -> Union[int, None]:
+        res = await self.db_session.execute(select_user_version, {"user_id": user_id})
+        return res.scalar_one_or_none()
+
     # Получение пользователя по email
     async def get_user_by_email(self, email: str) -> Union[User, None]:
-        query = select(User).where(User.email == email)
-        res = await self.db_session.execute(query)
+        res = await self.db_session.execute(select_user_by_email, {"email": email})
         user_row = res.fetchone()
         if user_row is not None:
             return user_row[0]
@@ -60,10 +124,76 @@ class UserDAL:
         query = (
             update(User)
             .where(and_(User.user_id == user_id, User.is_active == True))
-            .values(kwargs)
+            .values({**kwargs, "row_version": User.row_version + 1})
             .returning(User.user_id)
         )
         res = await self.db_session.execute(query)
         update_user_id_row = res.fetchone()
         if update_user_id_row is not None:
             return update_user_id_row[0]
+
+    # Подписка на пользователя
+    async def follow_user(self, follower_id: UUID, followee_id: UUID) -> bool:
+        res = await self.db_session.execute(
+            insert_follow, {"b_follower_id": follower_id, "b_followee_id": followee_id}
+        )
+        if res.fetchone() is None:
+            return False
+        await self.db_session.execute(
+            change_follower_count, {"b_user_id": followee_id, "delta": 1}
+        )
+        return True
+
+    # Отписка от пользователя
+    async def unfollow_user(self, follower_id: UUID, followee_id: UUID) -> bool:
+        res = await self.db_session.execute(
+            delete_follow, {"follower_id": follower_id, "followee_id": followee_id}
+        )
+        if res.fetchone() is None:
+            return False
+        await self.db_session.execute(
+            change_follower_count, {"b_user_id": followee_id, "delta": -1}
+        )
+        return True
+
+    # Получение количества подписчиков пользователя
+    async def get_follower_count(self, user_id: UUID) -> Union[int, None]:
+        res = await self.db_session.execute(select_follower_count, {"user_id": user_id})
+        return res.scalar_one_or_none()
+
+    # Отзыв всех выданных пользователю токенов
+    async def revoke_user_tokens(self, user_id: UUID) -> None:
+        await self.db_session.execute(upsert_revocation, {"b_user_id": user_id})
+
+    # Получение отзывов токенов, сделанных после указанного момента
+    async def get_revocations_since(
+        self, since: datetime.datetime
+    ) -> List[Tuple[UUID, datetime.datetime]]:
+        res = await self.db_session.execute(select_revocations_since, {"since": since})
+        return [tuple(row) for row in res]
+
+    # Массовое создание пользователей через COPY, возвращает email созданных
+    async def copy_users(self, rows: List[tuple]) -> List[str]:
+        table = User.__table__.name
+        columns = ["user_id", "name", "surname", "email", "is_active", "hashed_password"]
+        column_list = ", ".join(columns)
+        connection = await self.db_session.connection()
+        raw_connection = await connection.get_raw_connection()
+        #  COPY доступен только через соединение asyncpg
+        driver_connection = raw_connection.driver_connection
+        async with driver_connection.transaction():
+            #  COPY не поддерживает ON CONFLICT, поэтому строки сначала
+            #  копируются во временную таблицу
+            await driver_connection.execute(
+                f"CREATE TEMP TABLE {table}_import (LIKE {table} INCLUDING DEFAULTS) "
+                "ON COMMIT DROP"
+            )
+            await driver_connection.copy_records_to_table(
+                f"{table}_import", records=rows, columns=columns
+            )
+            inserted = await driver_connection.fetch(
+                f"INSERT INTO {table} ({column_list}) "
+                f"SELECT {column_list} FROM {table}_import "
+                "ON CONFLICT (email) DO NOTHING RETURNING email"
+            )
+        return [row["email"] for row in inserted]
@@ -1,7 +1,79 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List, Optional
+
 from passlib.context import CryptContext
 
+import settings
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+#  bcrypt отпускает GIL, поэтому хэширование выполняется в отдельных потоках
+_hashing_executor = ThreadPoolExecutor(
+    max_workers=settings.HASHING_MAX_WORKERS, thread_name_prefix="hashing"
+)
+_hashing_slots: Optional[asyncio.Semaphore] = None
+#  пул процессов для массового хэширования создаётся при первом использовании
+_hashing_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+class HashingStats:
+    """Метрики очереди хэширования паролей"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.completed = 0
+        self.queue_wait_seconds_total = 0.0
+        self.queue_wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        self.completed += 1
+        self.queue_wait_seconds_total += seconds
+        self.queue_wait_seconds_max = max(self.queue_wait_seconds_max, seconds)
+
+
+hashing_stats = HashingStats()
+
+
+def _timed_call(func: Callable, *args):
+    return time.perf_counter(), func(*args)
+
+
+#  выполнение функции хэширования в пуле потоков с ограничением одновременных вызовов
+async def _run_in_hashing_pool(func: Callable, *args):
+    global _hashing_slots
+    if _hashing_slots is None:
+        _hashing_slots = asyncio.Semaphore(settings.HASHING_MAX_CONCURRENCY)
+    queued_at = time.perf_counter()
+    hashing_stats.in_flight += 1
+    try:
+        async with _hashing_slots:
+            started_at, result = await asyncio.get_running_loop().run_in_executor(
+                _hashing_executor, _timed_call, func, *args
+            )
+    finally:
+        hashing_stats.in_flight -= 1
+    hashing_stats.record_wait(started_at - queued_at)
+    return result
+
+
+#  хэширование списка паролей в процессе пула
+def _hash_passwords(passwords: List[str]) -> List[str]:
+    return [pwd_context.hash(password) for password in passwords]
+
+
+def _get_hashing_process_pool() -> ProcessPoolExecutor:
+    global _hashing_process_pool
+    if _hashing_process_pool is None:
+        #  spawn не копирует в дочерние процессы соединения и цикл событий
+        _hashing_process_pool = ProcessPoolExecutor(
+            max_workers=settings.HASHING_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _hashing_process_pool
+
 
 #  класс хэша
 class Hasher:
@@ -14,3 +86,32 @@ class Hasher:
     def get_password_hash(password: str) -> str:
         """получение хэша пароля"""
         return pwd_context.hash(password)
+
+    @staticmethod
+    async def verify_password_async(plain_password, hashed_password) -> bool:
+        """верификация пароля вне цикла событий"""
+        return await _run_in_hashing_pool(
+            Hasher.verify_password, plain_password, hashed_password
+        )
+
+    @staticmethod
+    async def get_password_hash_async(password: str) -> str:
+        """получение хэша пароля вне цикла событий"""
+        return await _run_in_hashing_pool(Hasher.get_password_hash, password)
+
+    @staticmethod
+    async def get_password_hashes_parallel(passwords: List[str]) -> List[str]:
+        """получение хэшей списка паролей на всех процессах пула"""
+        workers = settings.HASHING_PROCESS_WORKERS
+        part_size = max(1, -(-len(passwords) // workers))
+        loop = asyncio.get_running_loop()
+        pool = _get_hashing_process_pool()
+        parts = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    pool, _hash_passwords, passwords[start : start + part_size]
+                )
+                for start in range(0, len(passwords), part_size)
+            )
+        )
+        return [hashed for part in parts for hashed in part]
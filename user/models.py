@@ -2,9 +2,15 @@ import uuid
 
 from sqlalchemy import Boolean
 from sqlalchemy import Column
+from sqlalchemy import DateTime
+from sqlalchemy import ForeignKey
+from sqlalchemy import Index
+from sqlalchemy import Integer
 from sqlalchemy import String
+from sqlalchemy import Table
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.sql import func
 
 Base = declarative_base()
 
@@ -20,3 +26,29 @@ class User(Base):
     email = Column(String, nullable=False, unique=True)
     is_active = Column(Boolean(), default=True)
     hashed_password = Column(String, nullable=False)
+    follower_count = Column(Integer, nullable=False, default=0, server_default="0")
+    #  увеличивается при каждом изменении пользователя, используется для ETag
+    row_version = Column(Integer, nullable=False, default=1, server_default="1")
+
+
+#  подписки пользователей друг на друга
+follow_table = Table(
+    "follows",
+    Base.metadata,
+    Column("follower_id", UUID(as_uuid=True), ForeignKey(User.user_id), primary_key=True),
+    Column("followee_id", UUID(as_uuid=True), ForeignKey(User.user_id), primary_key=True),
+    Column("time_created", DateTime(timezone=True), default=func.now()),
+    #  индекс для выборки подписчиков автора при рассылке поста
+    Index("ix_follows_followee_id_follower_id", "followee_id", "follower_id"),
+)
+
+
+#  отзыв токенов: токены пользователя, выданные до revoked_at, недействительны
+user_revocation_table = Table(
+    "user_revocations",
+    Base.metadata,
+    Column("user_id", UUID(as_uuid=True), ForeignKey(User.user_id), primary_key=True),
+    Column("revoked_at", DateTime(timezone=True), nullable=False),
+    #  индекс для инкрементального чтения новых отзывов
+    Index("ix_user_revocations_revoked_at", "revoked_at"),
+)
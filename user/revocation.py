@@ -0,0 +1,87 @@
+import asyncio
+import datetime
+import time
+from logging import getLogger
+from typing import Dict, Optional
+from uuid import UUID
+
+import settings
+from session import async_session
+
+from .dals import UserDAL
+
+logger = getLogger(__name__)
+
+#  запас на транзакции, зафиксированные позже, чем было записано их revoked_at
+REFRESH_OVERLAP = datetime.timedelta(seconds=60)
+
+
+class RevocationList:
+    """In-memory copy of recent token revocations, refreshed incrementally"""
+
+    def __init__(self, refresh_interval: float, token_lifetime: datetime.timedelta):
+        self.refresh_interval = refresh_interval
+        self.token_lifetime = token_lifetime
+        self._revoked_at: Dict[UUID, float] = {}
+        self._refreshed_until: Optional[datetime.datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    #  токен отозван, если выдан не позже последнего отзыва пользователя;
+    #  iat хранится с точностью до секунды, поэтому сравнение нестрогое
+    def is_revoked(self, user_id: UUID, issued_at: float) -> bool:
+        revoked_at = self._revoked_at.get(user_id)
+        return revoked_at is not None and issued_at <= revoked_at
+
+    def revoke(self, user_id: UUID, revoked_at: Optional[float] = None) -> None:
+        revoked_at = time.time() if revoked_at is None else revoked_at
+        self._revoked_at[user_id] = max(revoked_at, self._revoked_at.get(user_id, 0))
+
+    #  загрузка новых отзывов и удаление тех, что старше срока жизни токена
+    async def refresh(self) -> None:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        oldest_valid = now - self.token_lifetime
+        since = oldest_valid
+        if self._refreshed_until is not None:
+            since = max(since, self._refreshed_until - REFRESH_OVERLAP)
+        async with async_session() as session:
+            async with session.begin():
+                revocations = await UserDAL(session).get_revocations_since(since)
+        for user_id, revoked_at in revocations:
+            self.revoke(user_id, revoked_at.timestamp())
+        self._refreshed_until = now
+        expired_before = oldest_valid.timestamp()
+        for user_id in [
+            user_id
+            for user_id, revoked_at in self._revoked_at.items()
+            if revoked_at < expired_before
+        ]:
+            del self._revoked_at[user_id]
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as err:
+                logger.error(err)
+
+    async def start(self) -> None:
+        if self._task is None:
+            #  отзывы загружаются до приёма первых запросов
+            await self.refresh()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+revocation_list = RevocationList(
+    refresh_interval=settings.AUTH_REVOCATION_REFRESH_SECONDS,
+    token_lifetime=datetime.timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+)
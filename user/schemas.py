@@ -1,6 +1,6 @@
 import re
 import uuid
-from typing import Optional
+from typing import List, Optional
 
 from fastapi import HTTPException
 from pydantic import BaseModel
@@ -25,6 +25,19 @@ class ShowUser(TunedModel):
     surname: str
     email: EmailStr
     is_active: bool
+    row_version: int
+
+
+class Principal(BaseModel):
+    """Модель аутентифицированного пользователя"""
+    user_id: uuid.UUID
+    email: str
+    is_active: bool
+
+    class Config:
+        """principal is shared between requests, so it must not be changed"""
+
+        allow_mutation = False
 
 
 class UserCreate(BaseModel):
@@ -53,6 +66,23 @@ class UserCreate(BaseModel):
         return value
 
 
+class BulkUserResult(BaseModel):
+    """Модель результата создания одного пользователя при массовом импорте"""
+    index: int
+    email: Optional[str]
+    status: str
+    user_id: Optional[uuid.UUID]
+    detail: Optional[str]
+
+
+class BulkUserCreateResponse(BaseModel):
+    """Модель ответа массового импорта пользователей"""
+    created: int
+    conflicts: int
+    invalid: int
+    results: List[BulkUserResult]
+
+
 class DeleteUserResponse(BaseModel):
     """Модель удаления пользователя"""
     deleted_user_id: uuid.UUID
@@ -1,30 +1,41 @@
-from typing import Union
-from uuid import UUID
+from typing import AsyncIterator, List, Tuple, Union
+from uuid import UUID, uuid4
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends
 from fastapi import HTTPException
 from starlette import status
 from jose import JWTError
+from pydantic import ValidationError
 import settings
+from cache import TTLCache
+from etag import make_etag
+from singleflight import SingleFlight
+from .schemas import BulkUserCreateResponse
+from .schemas import BulkUserResult
+from .schemas import Principal
 from .schemas import ShowUser
 from .schemas import UserCreate
 from .dals import UserDAL
 from .hashing import Hasher
-from session import get_db
+from session import get_db, is_replica_session
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
 from .models import User
+from .revocation import revocation_list
+from post.dals import PostDAL
 
 
 #  создание пользователя
 async def _create_new_user(body: UserCreate, session) -> ShowUser:
+    #  хэш считается до начала транзакции, чтобы не держать соединение
+    hashed_password = await Hasher.get_password_hash_async(body.password)
     async with session.begin():
         user_dal = UserDAL(session)
         user = await user_dal.create_user(
             name=body.name,
             surname=body.surname,
             email=body.email,
-            hashed_password=Hasher.get_password_hash(body.password),
+            hashed_password=hashed_password,
         )
         return ShowUser(
             user_id=user.user_id,
@@ -32,9 +43,121 @@ async def _create_new_user(body: UserCreate, session) -> ShowUser:
             surname=user.surname,
             email=user.email,
             is_active=user.is_active,
+            row_version=user.row_version,
         )
 
 
+#  разбиение потока байтов на строки
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+#  создание одной пачки пользователей массового импорта
+async def _import_user_chunk(
+    chunk: List[Tuple[int, UserCreate]], session
+) -> List[BulkUserResult]:
+    results = []
+    unique = []
+    seen_emails = set()
+    for index, body in chunk:
+        if body.email in seen_emails:
+            results.append(
+                BulkUserResult(
+                    index=index,
+                    email=body.email,
+                    status="conflict",
+                    detail="Duplicate email in import",
+                )
+            )
+            continue
+        seen_emails.add(body.email)
+        unique.append((index, body))
+
+    hashed_passwords = await Hasher.get_password_hashes_parallel(
+        [body.password for _, body in unique]
+    )
+    rows = [
+        (uuid4(), body.name, body.surname, str(body.email), True, hashed_password)
+        for (_, body), hashed_password in zip(unique, hashed_passwords)
+    ]
+    async with session.begin():
+        user_dal = UserDAL(session)
+        created_emails = set(await user_dal.copy_users(rows))
+
+    for (index, body), row in zip(unique, rows):
+        if row[3] in created_emails:
+            results.append(
+                BulkUserResult(
+                    index=index, email=body.email, status="created", user_id=row[0]
+                )
+            )
+        else:
+            results.append(
+                BulkUserResult(
+                    index=index,
+                    email=body.email,
+                    status="conflict",
+                    detail="User with this email already exists",
+                )
+            )
+    return results
+
+
+#  массовое создание пользователей из потока записей NDJSON
+async def _bulk_create_users(
+    body: AsyncIterator[bytes], session
+) -> BulkUserCreateResponse:
+    results = []
+    chunk = []
+    index = 0
+    async for line in _iter_lines(body):
+        if not line.strip():
+            continue
+        #  ошибка в одной записи не прерывает импорт остальных
+        try:
+            chunk.append((index, UserCreate.parse_raw(line)))
+        except ValidationError as err:
+            results.append(BulkUserResult(index=index, status="invalid", detail=str(err)))
+        except HTTPException as err:
+            results.append(BulkUserResult(index=index, status="invalid", detail=err.detail))
+        index += 1
+        if len(chunk) >= settings.BULK_IMPORT_CHUNK_SIZE:
+            results.extend(await _import_user_chunk(chunk, session))
+            chunk = []
+    if chunk:
+        results.extend(await _import_user_chunk(chunk, session))
+
+    results.sort(key=lambda result: result.index)
+    statuses = [result.status for result in results]
+    return BulkUserCreateResponse(
+        created=statuses.count("created"),
+        conflicts=statuses.count("conflict"),
+        invalid=statuses.count("invalid"),
+        results=results,
+    )
+
+
+#  кэш аутентифицированных пользователей по email из токена;
+#  кэш свой у каждого процесса, в остальных процессах изменения видны через TTL
+principal_cache = TTLCache(
+    max_size=settings.AUTH_CACHE_MAX_SIZE,
+    ttl=settings.AUTH_CACHE_TTL_SECONDS,
+    name="principal_by_email",
+)
+
+
+#  удаление пользователя из кэша аутентификации
+def _invalidate_principal(user_id: UUID) -> None:
+    principal_cache.delete_where(lambda principal: principal.user_id == user_id)
+
+
 #  удаление пользователя
 async def _delete_user(user_id: UUID, session) -> Union[UUID, None]:
     async with session.begin():
@@ -42,7 +165,12 @@ async def _delete_user(user_id: UUID, session) -> Union[UUID, None]:
         deleted_user_id = await user_dal.delete_user(
             user_id=user_id,
         )
-        return deleted_user_id
+        if deleted_user_id is not None:
+            await user_dal.revoke_user_tokens(user_id=user_id)
+    _invalidate_principal(user_id)
+    if deleted_user_id is not None:
+        revocation_list.revoke(user_id)
+    return deleted_user_id
 
 
 #  обновление пользователя
@@ -54,11 +182,18 @@ async def _update_user(
         updated_user_id = await user_dal.update_user(
             user_id=user_id, **updated_user_params
         )
-        return updated_user_id
+        #  смена email делает недействительными токены со старым email
+        email_changed = updated_user_id is not None and "email" in updated_user_params
+        if email_changed:
+            await user_dal.revoke_user_tokens(user_id=user_id)
+    _invalidate_principal(user_id)
+    if email_changed:
+        revocation_list.revoke(user_id)
+    return updated_user_id
 
 
-#  получение пользователя
-async def _get_user_by_id(user_id: UUID, session) -> Union[ShowUser, None]:
+#  загрузка пользователя из базы
+async def _load_user(user_id: UUID, session) -> Union[ShowUser, None]:
     async with session.begin():
         user_dal = UserDAL(session)
         user = await user_dal.get_user_by_id(
@@ -71,7 +206,65 @@ async def _get_user_by_id(user_id: UUID, session) -> Union[ShowUser, None]:
                 surname=user.surname,
                 email=user.email,
                 is_active=user.is_active,
+                row_version=user.row_version,
+            )
+
+
+#  одновременные запросы одного пользователя выполняются одним запросом в базу
+user_lookups = SingleFlight("user_by_id")
+
+
+#  получение пользователя; чтения с реплики и с основной базы не объединяются
+async def _get_user_by_id(user_id: UUID, session) -> Union[ShowUser, None]:
+    return await user_lookups.do(
+        (user_id, is_replica_session(session)), lambda: _load_user(user_id, session)
+    )
+
+
+#  ETag пользователя по его версии строки
+def _user_etag(user_id: UUID, row_version: int) -> str:
+    return make_etag("user", user_id, row_version)
+
+
+#  получение ETag пользователя без загрузки всей строки
+async def _get_user_etag(user_id: UUID, session) -> Union[str, None]:
+    async with session.begin():
+        user_dal = UserDAL(session)
+        row_version = await user_dal.get_user_version(user_id=user_id)
+    if row_version is not None:
+        return _user_etag(user_id, row_version)
+
+
+#  подписка на пользователя
+async def _follow_user(follower_id: UUID, followee_id: UUID, session) -> bool:
+    async with session.begin():
+        user_dal = UserDAL(session)
+        followed = await user_dal.follow_user(
+            follower_id=follower_id, followee_id=followee_id
+        )
+        follower_count = await user_dal.get_follower_count(user_id=followee_id)
+        #  посты автора с небольшим числом подписчиков сразу попадают в ленту
+        if followed and follower_count <= settings.TIMELINE_FANOUT_MAX_FOLLOWERS:
+            await PostDAL(session).backfill_timeline(
+                user_id=follower_id,
+                author_id=followee_id,
+                max_length=settings.TIMELINE_MAX_LENGTH,
             )
+        return followed
+
+
+#  отписка от пользователя
+async def _unfollow_user(follower_id: UUID, followee_id: UUID, session) -> bool:
+    async with session.begin():
+        user_dal = UserDAL(session)
+        unfollowed = await user_dal.unfollow_user(
+            follower_id=follower_id, followee_id=followee_id
+        )
+        if unfollowed:
+            await PostDAL(session).remove_author_from_timeline(
+                user_id=follower_id, author_id=followee_id
+            )
+        return unfollowed
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login/token")
@@ -86,6 +279,13 @@ async def _get_user_by_email_for_auth(email: str, session: AsyncSession):
         )
 
 
+#  загрузка аутентифицированного пользователя из базы
+async def _load_principal(email: str, session: AsyncSession) -> Union[Principal, None]:
+    user = await _get_user_by_email_for_auth(email=email, session=session)
+    if user is not None:
+        return Principal(user_id=user.user_id, email=user.email, is_active=user.is_active)
+
+
 #  аутентификация пользователя
 async def authenticate_user(
     email: str, password: str, db: AsyncSession
@@ -93,15 +293,16 @@ async def authenticate_user(
     user = await _get_user_by_email_for_auth(email=email, session=db)
     if user is None:
         return
-    if not Hasher.verify_password(password, user.hashed_password):
+    if not await Hasher.verify_password_async(password, user.hashed_password):
         return
     return user
 
 
-#  получеение актуального пользователя из токена
+#  получеение актуального пользователя из токена; при промахе кэша пользователь
+#  читается с основной базы: реплика может ещё не знать о его деактивации
 async def get_current_user_from_token(
     token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
-):
+) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -111,12 +312,27 @@ async def get_current_user_from_token(
             token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
         )
         email: str = payload.get("sub")
-        print("username/email extracted is ", email)
         if email is None:
             raise credentials_exception
-    except JWTError:
+        #  токен с данными пользователя проверяется без запроса в базу
+        if settings.AUTH_STATELESS_TOKENS and "user_id" in payload:
+            principal = Principal(
+                user_id=payload["user_id"],
+                email=email,
+                is_active=payload.get("is_active", False),
+            )
+            if not principal.is_active or revocation_list.is_revoked(
+                principal.user_id, payload.get("iat", 0)
+            ):
+                raise credentials_exception
+            return principal
+    except (JWTError, ValidationError):
         raise credentials_exception
-    user = await _get_user_by_email_for_auth(email=email, session=db)
-    if user is None:
+    #  одновременные запросы одного пользователя разделяют одну загрузку из базы
+    principal = await principal_cache.get_or_load(
+        email, lambda: _load_principal(email=email, session=db)
+    )
+    #  деактивированный пользователь теряет доступ сразу после удаления
+    if principal is None or not principal.is_active:
         raise credentials_exception
-    return user
+    return principal